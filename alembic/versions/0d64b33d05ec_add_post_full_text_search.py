@@ -0,0 +1,40 @@
+"""add post full-text search
+
+Revision ID: 0d64b33d05ec
+Revises: ab8ff97309b7
+Create Date: 2026-10-18 11:04:52.771630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d64b33d05ec'
+down_revision: Union[str, Sequence[str], None] = 'ab8ff97309b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Adding a stored generated column rewrites the table once to compute it
+    op.add_column('post', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                    "setweight(to_tsvector('english', coalesce(content, '')), 'B')", persisted=True),
+        nullable=True, comment='Full-text search document of the post, title weighted above content'))
+    op.create_index('ix_post_search_vector', 'post', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_post_title_trgm', 'post', ['title'], unique=False, postgresql_using='gin',
+                    postgresql_ops={'title': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_title_trgm', table_name='post', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.drop_index('ix_post_search_vector', table_name='post', postgresql_using='gin')
+    op.drop_column('post', 'search_vector')
@@ -0,0 +1,30 @@
+"""add post.version
+
+Revision ID: 3a9d27f5e0b6
+Revises: e7d35b90c1f4
+Create Date: 2026-10-18 19:21:47.630385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9d27f5e0b6'
+down_revision: Union[str, Sequence[str], None] = 'e7d35b90c1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant default is stored in the catalog, the table is not rewritten
+    op.add_column('post', sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False,
+                                    comment='Incremented by every update, for optimistic concurrency control'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('post', 'version')
@@ -0,0 +1,40 @@
+"""add refresh_tokens
+
+Revision ID: 5b2e8c41d7a9
+Revises: 0d64b33d05ec
+Create Date: 2026-10-18 15:12:40.208316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e8c41d7a9'
+down_revision: Union[str, Sequence[str], None] = '0d64b33d05ec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'refresh_tokens',
+        sa.Column('token_hash', sa.String(length=64), nullable=False, comment='SHA-256 hex digest of the refresh token, the token itself is never stored'),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False, comment='Identifier of the user the token was issued to'),
+        sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False, comment='Time after which the token is refused'),
+        sa.Column('revoked_at', sa.TIMESTAMP(timezone=True), nullable=True, comment='Time the token was used, replaced or revoked, null while valid'),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('token_hash'),
+    )
+    op.create_index(op.f('ix_refresh_tokens_user_id'), 'refresh_tokens', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_refresh_tokens_user_id'), table_name='refresh_tokens')
+    op.drop_table('refresh_tokens')
@@ -0,0 +1,44 @@
+"""add post_vote_buckets
+
+Revision ID: 9c4f1a6e2b83
+Revises: 5b2e8c41d7a9
+Create Date: 2026-10-18 16:40:03.517924
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f1a6e2b83'
+down_revision: Union[str, Sequence[str], None] = '5b2e8c41d7a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'post_vote_buckets',
+        sa.Column('post_id', sa.Integer(), nullable=False, comment='Identifier of the post'),
+        sa.Column('bucket_start', sa.TIMESTAMP(timezone=True), nullable=False, comment='Start of the UTC hour the votes were cast in'),
+        sa.Column('votes', sa.Integer(), nullable=False, comment='Votes cast in the hour and still standing, maintained by the vote endpoint'),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('post_id', 'bucket_start'),
+    )
+    op.create_index('ix_post_vote_buckets_bucket_start', 'post_vote_buckets', ['bucket_start'], unique=False)
+    # Backfill the hours still covered by the longest ranking window (7 days)
+    op.execute(
+        "INSERT INTO post_vote_buckets (post_id, bucket_start, votes) "
+        "SELECT post_id, date_trunc('hour', created_at, 'UTC'), count(*) FROM votes "
+        "WHERE created_at >= date_trunc('hour', now(), 'UTC') - interval '7 days' "
+        "GROUP BY post_id, date_trunc('hour', created_at, 'UTC')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_vote_buckets_bucket_start', table_name='post_vote_buckets')
+    op.drop_table('post_vote_buckets')
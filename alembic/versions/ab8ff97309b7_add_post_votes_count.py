@@ -0,0 +1,34 @@
+"""add post.votes_count
+
+Revision ID: ab8ff97309b7
+Revises: fc03e13519a3
+Create Date: 2026-10-18 09:27:05.914452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ab8ff97309b7'
+down_revision: Union[str, Sequence[str], None] = 'fc03e13519a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('post', sa.Column('votes_count', sa.Integer(), server_default=sa.text('0'), nullable=False,
+                                    comment='Number of votes on the post, maintained by the vote endpoint'))
+    op.execute(
+        "UPDATE post SET votes_count = counts.votes "
+        "FROM (SELECT post_id, count(*) AS votes FROM votes GROUP BY post_id) AS counts "
+        "WHERE post.id = counts.post_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('post', 'votes_count')
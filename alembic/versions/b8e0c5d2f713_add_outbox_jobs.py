@@ -0,0 +1,43 @@
+"""add outbox_jobs
+
+Revision ID: b8e0c5d2f713
+Revises: 3a9d27f5e0b6
+Create Date: 2026-10-18 21:05:36.912874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e0c5d2f713'
+down_revision: Union[str, Sequence[str], None] = '3a9d27f5e0b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_jobs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False, comment='Unique identifier of the job'),
+        sa.Column('kind', sa.String(length=64), nullable=False, comment='Event kind, selects the handlers that run the job'),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False, comment='Arguments of the handlers'),
+        sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False, comment='Times the job was claimed'),
+        sa.Column('available_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False, comment='Time from which the job can be claimed, pushed back by leases and retries'),
+        sa.Column('last_error', sa.Text(), nullable=True, comment='Error of the last failed run'),
+        sa.Column('failed_at', sa.TIMESTAMP(timezone=True), nullable=True, comment='Time the job was given up, after its last attempt'),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_outbox_jobs_available_at', 'outbox_jobs', ['available_at'], unique=False,
+                    postgresql_where=sa.text('failed_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_jobs_available_at', table_name='outbox_jobs', postgresql_where=sa.text('failed_at IS NULL'))
+    op.drop_table('outbox_jobs')
@@ -0,0 +1,46 @@
+"""index post.owner_id and votes.post_id, drop redundant primary key indexes
+
+Revision ID: e7d35b90c1f4
+Revises: 9c4f1a6e2b83
+Create Date: 2026-10-18 17:58:21.044631
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d35b90c1f4'
+down_revision: Union[str, Sequence[str], None] = '9c4f1a6e2b83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps votes and posts writable while the indexes build; it
+    # cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, column in (('ix_votes_post_id', 'votes', 'post_id'), ('ix_post_owner_id', 'post', 'owner_id')):
+            # A failed or interrupted concurrent build leaves an INVALID index
+            # behind, which IF NOT EXISTS would keep; drop it to build it again
+            invalid = op.get_bind().execute(sa.text(
+                "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:name) AND NOT indisvalid"),
+                {"name": name}).first()
+            if invalid is not None:
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+            op.create_index(name, table, [column], unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+    # Duplicates of the primary key indexes, only slowing writes down
+    op.drop_index(op.f('ix_post_id'), table_name='post', if_exists=True)
+    op.drop_index(op.f('ix_users_id'), table_name='users', if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_post_id'), 'post', ['id'], unique=False)
+    op.drop_index('ix_post_owner_id', table_name='post')
+    op.drop_index('ix_votes_post_id', table_name='votes')
@@ -0,0 +1,71 @@
+"""initial schema
+
+Revision ID: fc03e13519a3
+Revises: 
+Create Date: 2026-10-18 09:12:41.308214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc03e13519a3'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False, comment='Unique identifier of the user'),
+        sa.Column('email', sa.String(), nullable=False, comment='Email address of the user'),
+        sa.Column('password', sa.String(), nullable=False, comment='Hashed password of the user'),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False, if_not_exists=True)
+
+    op.create_table(
+        'post',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False, comment='Unique identifier of the post'),
+        sa.Column('title', sa.String(length=200), nullable=False, comment='Title of the post'),
+        sa.Column('content', sa.String(), nullable=False, comment='Content of the post'),
+        sa.Column('published', sa.Boolean(), nullable=False, comment='Publication status of the post'),
+        sa.Column('rating', sa.Integer(), nullable=True, comment='Rating of the post'),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('owner_id', postgresql.UUID(as_uuid=True), nullable=False, comment='Identifier of the user who created the post'),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index(op.f('ix_post_id'), 'post', ['id'], unique=False, if_not_exists=True)
+    op.create_index('ix_post_created_at_id', 'post', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False, if_not_exists=True)
+
+    op.create_table(
+        'votes',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False, comment='Identifier of the user who voted'),
+        sa.Column('post_id', sa.Integer(), nullable=False, comment='Identifier of the post that was voted on'),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'post_id'),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('votes')
+    op.drop_index('ix_post_created_at_id', table_name='post')
+    op.drop_index(op.f('ix_post_id'), table_name='post')
+    op.drop_table('post')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
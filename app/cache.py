@@ -0,0 +1,173 @@
+import hashlib
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from .config import get_settings
+
+#-------------------------------------------------------------------------------
+# Cache backends
+#-------------------------------------------------------------------------------
+class CacheBackend:
+    """
+    Interface of the response cache: serialized bodies keyed by strings.
+
+    Backends are async so that a networked store (Redis or anything speaking
+    its protocol) can implement them without blocking the event loop.
+    ``shared`` tells whether every worker process sees the same entries.
+    """
+
+    shared = False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    """Cache that stores nothing, used when caching is disabled."""
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, ttl):
+        pass
+
+    async def delete(self, *keys):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU cache with per-entry TTL.
+
+    Only touched from the event loop, so it needs no lock. Each worker process
+    has its own copy, which is why writes must invalidate through ``delete``
+    and entries must expire: another worker may have changed the row.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class RedisCache(CacheBackend):
+    """Cache stored in Redis, shared by every worker. Takes a ``redis.asyncio`` compatible client."""
+
+    shared = True
+
+    def __init__(self, client, prefix: str = "fastapi_post:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key):
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key, value, ttl):
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys):
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+
+@lru_cache
+def get_response_cache() -> CacheBackend:
+    """The backend chosen by the settings, built on first use."""
+    settings = get_settings()
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        # redis is only needed by deployments that choose this backend
+        from redis import asyncio as redis
+        return RedisCache(redis.from_url(settings.REDIS_URL))
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
+    return NullCache()
+
+#-------------------------------------------------------------------------------
+# Keys and conditional responses
+#-------------------------------------------------------------------------------
+def post_key(post_id: int) -> str:
+    # v2 entries are versioned bodies, see with_version
+    return f"post:v2:{post_id}"
+
+
+def user_key(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def shared() -> bool:
+    """Whether the response cache is shared by the worker processes."""
+    return get_response_cache().shared
+
+
+async def cache_body(key: str, body: bytes):
+    await get_response_cache().set(key, body, get_settings().RESPONSE_CACHE_TTL_SECONDS)
+
+
+def version_etag(version: int) -> str:
+    """ETag of a resource whose representation changes only with its version column."""
+    return f'"v{version}"'
+
+
+def with_version(version: int, body: bytes) -> bytes:
+    """Cache entry of a body along with its version, so a hit gets the ETag without parsing the JSON."""
+    return b"%d:" % version + body
+
+
+def split_version(entry: bytes) -> Tuple[int, bytes]:
+    """Version and body of an entry made by ``with_version``."""
+    version, body = entry.split(b":", 1)
+    return int(version), body
+
+
+def parse_version_etag(header: str) -> Optional[int]:
+    """Version named by an ``If-Match`` header, None for ``*`` or an ETag that names none."""
+    tag = header.strip()
+    if tag.startswith('"v') and tag.endswith('"') and tag[2:-1].isdigit():
+        return int(tag[2:-1])
+    return None
+
+
+def json_response(body: bytes, request: Request, etag: Optional[str] = None) -> Response:
+    """
+    Answer with a serialized JSON body and its ETag.
+
+    The ETag is a digest of the body unless the caller knows a cheaper one. A
+    request whose ``If-None-Match`` carries the current ETag gets an empty 304
+    instead.
+    """
+    etag = etag or f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
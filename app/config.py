@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Dict, Literal
+
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -11,10 +14,61 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(..., description="Secret key for JWT")
     ALGORITHM: str = Field(..., description="Algorithm for JWT")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(..., description="Access token expiration time in minutes")
+    REFRESH_TOKEN_EXPIRE_DAYS: int = Field(30, ge=1, description="Lifetime of a refresh token, renewed each time it is used")
+    SIGNING_KEY_ID: str = Field("default", min_length=1, description="Key id (kid header) of SECRET_KEY, the key that signs new access tokens")
+    PREVIOUS_SIGNING_KEYS: Dict[str, str] = Field({}, description="Retired keys still accepted for verification, as a JSON object of kid to secret")
+    TOKEN_CACHE_SIZE: int = Field(1024, ge=0, description="Verified access tokens kept in memory, 0 disables the cache")
+    DATABASE_POOL_SIZE: int = Field(10, ge=1, description="Connections kept open in the pool")
+    DATABASE_MAX_OVERFLOW: int = Field(20, ge=0, description="Extra connections opened beyond the pool size under load")
+    DATABASE_POOL_TIMEOUT: float = Field(30, gt=0, description="Seconds to wait for a free connection before failing the request")
+    DATABASE_POOL_RECYCLE: int = Field(1800, ge=-1, description="Age in seconds after which a connection is replaced, -1 never")
+    DATABASE_POOL_PRE_PING: bool = Field(True, description="Test connections on checkout and replace the dead ones")
+    DATABASE_ECHO: bool = Field(False, description="Log every SQL statement (slow, for debugging only)")
+    DATABASE_POOL_WARMUP: int = Field(2, ge=0, description="Connections opened at startup, before the first request")
+    DATABASE_CREATE_TABLES: bool = Field(False, description="Create missing tables at startup, for development; skipped when Alembic manages the schema")
+    DATABASE_MODE: Literal["sync", "async"] = Field("sync", description="Database driver mode: sync (psycopg2 in the threadpool) or async (asyncpg)")
+    RESPONSE_CACHE_BACKEND: Literal["memory", "redis", "none"] = Field("memory", description="Where serialized GET /posts/{id} and GET /user/users/{id} responses are cached")
+    RESPONSE_CACHE_TTL_SECONDS: float = Field(30, gt=0, description="Lifetime of a cached response")
+    RESPONSE_CACHE_MAX_ENTRIES: int = Field(10000, ge=1, description="Maximum number of responses kept by the memory cache")
+    REDIS_URL: str = Field("redis://localhost:6379/0", description="Redis URL used by the redis cache backend")
+    QUERY_BUDGET_ENFORCE: bool = Field(False, description="Fail requests whose SQL statement count exceeds the endpoint budget (for test runs)")
+    POSTS_BULK_MAX_SIZE: int = Field(5000, ge=1, description="Maximum number of posts accepted by POST /posts/bulk")
+    POSTS_EXPORT_CHUNK_SIZE: int = Field(1000, ge=1, description="Rows fetched from the server-side cursor per chunk of GET /posts/export")
+    VOTE_BATCH_MAX_SIZE: int = Field(500, ge=1, description="Maximum number of votes accepted by POST /vote/batch")
+    VOTE_BUFFER_WINDOW_MS: int = Field(0, ge=0, description="Window in ms during which single votes are grouped into one statement, 0 disables grouping")
+    RANKING_SIZE: int = Field(100, ge=1, description="Posts kept per window by the GET /posts/top ranking")
+    RANKING_REFRESH_SECONDS: float = Field(10, gt=0, description="Interval between refreshes of the top posts ranking, the most a vote takes to show in it")
+    JOBS_WORKERS: int = Field(2, ge=0, description="Outbox job tasks run by each app process, 0 leaves the jobs to other processes")
+    JOBS_BATCH_SIZE: int = Field(50, ge=1, description="Outbox jobs claimed at once by a task")
+    JOBS_POLL_SECONDS: float = Field(1, gt=0, description="Interval at which idle tasks look for jobs enqueued by other processes")
+    JOBS_LEASE_SECONDS: float = Field(60, gt=0, description="Time a claimed job has to finish before another task claims it again")
+    JOBS_MAX_ATTEMPTS: int = Field(10, ge=1, description="Runs of a failing job before it is left marked as failed")
+    READINESS_CACHE_SECONDS: float = Field(5, gt=0, description="How long a /readyz database ping result is reused")
+    READINESS_TIMEOUT_SECONDS: float = Field(2, gt=0, description="Time a /readyz database ping may take before the worker reports unready")
+    PASSWORD_HASH_WORKERS: int = Field(2, ge=1, description="Number of processes hashing and verifying passwords")
+    PASSWORD_HASH_QUEUE_SIZE: int = Field(8, ge=1, description="Password hashing jobs allowed in flight before answering 503, capped at DATABASE_POOL_SIZE")
+    RATE_LIMIT_BACKEND: Literal["memory", "redis", "none"] = Field("memory", description="Where rate limit counters are kept, redis shares them between workers")
+    RATE_LIMIT_WINDOW_SECONDS: float = Field(60, gt=0, description="Sliding window over which rate limits are counted")
+    RATE_LIMIT_LOGIN_PER_IP: int = Field(20, ge=0, description="Login attempts per client address per window, 0 disables the limit")
+    RATE_LIMIT_LOGIN_PER_EMAIL: int = Field(5, ge=0, description="Login attempts per email per window, 0 disables the limit")
+    RATE_LIMIT_REGISTER_PER_IP: int = Field(10, ge=0, description="Accounts created per client address per window, 0 disables the limit")
+    RATE_LIMIT_WRITES_PER_USER: int = Field(300, ge=0, description="Mutating requests per user per window, 0 disables the limit")
+    RATE_LIMIT_MAX_KEYS: int = Field(100000, ge=1, description="Maximum number of counters kept by the memory rate limiter")
 
     class Config:
         env_file = ".env"
         extra = "forbid"
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Settings read from the environment and ``.env`` once, on first use.
+
+    Modules call it where a value is used rather than binding it at import, so
+    tests can change the environment and call ``get_settings.cache_clear()``.
+    Singletons built from the settings are cached by their own ``get_*``
+    builders: clear those too, and ``database.dispose()`` drops the engine.
+    """
+    return Settings()
+
@@ -1,31 +1,287 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from .config import settings
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
 
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from .config import get_settings
+from .poolmetrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, pool_metrics
 
-DATABASE_URL = f"postgresql://{settings.DATABASE_USER}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
 
+def database_url(driver: str = "psycopg2") -> str:
+    settings = get_settings()
+    return f"postgresql+{driver}://{settings.DATABASE_USER}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOST}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
 
-engine = create_engine(
-    DATABASE_URL, 
-    pool_pre_ping=True, 
-    pool_recycle=30,
-    pool_size=10, 
-    max_overflow=20,
-    echo=True, 
-    future=True)
 
-SessionLocal = sessionmaker(
-    autocommit=False, 
-    autoflush=False, 
-    bind=engine)
+def async_mode() -> bool:
+    return get_settings().DATABASE_MODE == "async"
+
+
+def engine_options() -> dict:
+    settings = get_settings()
+    return dict(
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        echo=settings.DATABASE_ECHO)
+
+# Built on first use: creating the engine imports the DB driver, which workers
+# can do after they have started rather than at import time. The settings are
+# read then too, and again after ``dispose()``
+_engine = None
+_session_factory = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        if async_mode():
+            _engine = create_async_engine(database_url("asyncpg"), poolclass=TimedAsyncAdaptedQueuePool, **engine_options())
+        else:
+            _engine = create_engine(database_url(), future=True, poolclass=TimedQueuePool, **engine_options())
+        pool_metrics.instrument(_engine)
+    return _engine
+
+
+def get_session_factory():
+    global _session_factory
+    if _session_factory is None:
+        if async_mode():
+            _session_factory = async_sessionmaker(
+                autoflush=False,
+                expire_on_commit=False,
+                bind=get_engine())
+        else:
+            _session_factory = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+                bind=get_engine())
+    return _session_factory
+
+
+def __getattr__(name):
+    # ``database.engine`` and ``database.SessionLocal`` keep working, built on first access
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+#-------------------------------------------------------------------------------
+# Sync session exposed through the AsyncSession API
+#-------------------------------------------------------------------------------
+class ThreadedSession:
+    """
+    Wrap a sync ``Session`` so route handlers can await it like an ``AsyncSession``.
+
+    Every call that may touch the database runs in Starlette's threadpool, which
+    lets the same async handlers serve both ``DATABASE_MODE`` settings.
+
+    A session keeps its connection between those calls. If more sessions than
+    the pool can serve were active, every threadpool thread could end up
+    blocked on checkout while the sessions holding connections wait for a free
+    thread. So a session first takes a permit from a gate sized to the pool,
+    and keeps it until its transaction ends, when the session gives its
+    connection back: a handler that commits or rolls back before slow work,
+    like a password hash, holds neither meanwhile.
+    """
+
+    _gates = weakref.WeakKeyDictionary()
+
+    def __init__(self, sync_session):
+        self.sync_session = sync_session
+        self._gate = None
+
+    @classmethod
+    def _loop_gate(cls) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        gate = cls._gates.get(loop)
+        if gate is None:
+            settings = get_settings()
+            gate = cls._gates[loop] = asyncio.Semaphore(settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW)
+        return gate
+
+    async def _run(self, fn, *args, **kwargs):
+        if self._gate is None:
+            gate = self._loop_gate()
+            await gate.acquire()
+            self._gate = gate
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def connection(self, **kwargs):
+        return await self._run(self.sync_session.connection, **kwargs)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await self._run(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await self._run(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return await self._run(self.sync_session.scalars, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await self._run(self.sync_session.get, entity, ident, **kwargs)
+
+    async def refresh(self, instance, attribute_names=None):
+        await self._run(self.sync_session.refresh, instance, attribute_names)
+
+    async def delete(self, instance):
+        await self._run(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await self._run(self.sync_session.flush)
+
+    def _release(self):
+        if self._gate is not None:
+            self._gate.release()
+            self._gate = None
+
+    async def commit(self):
+        try:
+            await self._run(self.sync_session.commit)
+        finally:
+            self._release()
+
+    async def rollback(self):
+        try:
+            await self._run(self.sync_session.rollback)
+        finally:
+            self._release()
+
+    async def stream(self, statement, params=None, execution_options=None, **kwargs):
+        """Execute on a server-side cursor, like ``AsyncSession.stream``."""
+        execution_options = {**(execution_options or {}), "stream_results": True}
+        result = await self._run(self.sync_session.execute, statement, params,
+                                 execution_options=execution_options, **kwargs)
+        return ThreadedResult(result, self._run)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await self._run(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        try:
+            await run_in_threadpool(self.sync_session.close)
+        finally:
+            self._release()
+
+class ThreadedResult:
+    """The streaming part of ``AsyncResult`` over a sync ``Result``: each fetch runs in the threadpool."""
+
+    def __init__(self, result, run):
+        self.result = result
+        self._run = run
+
+    async def partitions(self, size=None):
+        while True:
+            rows = await self._run(self.result.fetchmany, size)
+            if not rows:
+                return
+            yield rows
+
+    async def close(self):
+        await self._run(self.result.close)
+
+#-------------------------------------------------------------------------------
+# Session dependency and schema helpers
+#-------------------------------------------------------------------------------
+@asynccontextmanager
+async def session_scope():
+    """Open a session for work outside a request, such as background flushes."""
+    if async_mode():
+        async with get_session_factory()() as db:
+            yield db
+    else:
+        db = ThreadedSession(get_session_factory()())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+async def get_db():
+    async with session_scope() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+def _create_all_unless_migrated(connection) -> bool:
+    # A database carrying an alembic_version table gets its schema from migrations
+    if inspect(connection).has_table("alembic_version"):
+        return False
+    Base.metadata.create_all(bind=connection)
+    return True
+
+
+async def create_all() -> bool:
+    """Create the tables that do not exist yet, unless Alembic manages the schema. Return whether it ran."""
+    if async_mode():
+        async with get_engine().begin() as conn:
+            return await conn.run_sync(_create_all_unless_migrated)
+
+    def create():
+        with get_engine().begin() as conn:
+            return _create_all_unless_migrated(conn)
+    return await run_in_threadpool(create)
+
+
+async def warm_up(count: int):
+    """Open up to ``count`` pooled connections ahead of the first requests."""
+    count = min(count, get_settings().DATABASE_POOL_SIZE)
+    if async_mode():
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(await get_engine().connect())
+        finally:
+            for conn in connections:
+                await conn.close()
+        return
+
+    def open_connections():
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(get_engine().connect())
+        finally:
+            for conn in connections:
+                conn.close()
+    await run_in_threadpool(open_connections)
+
+
+async def ping():
+    """Run a trivial query on a pooled connection."""
+    if async_mode():
+        async with get_engine().connect() as conn:
+            await conn.exec_driver_sql("SELECT 1")
+        return
+
+    def select_one():
+        with get_engine().connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+    await run_in_threadpool(select_one)
+
+
+async def dispose():
+    """Close every pooled connection; the next use builds the engine again from the settings."""
+    global _engine, _session_factory
+    engine, _engine, _session_factory = _engine, None, None
+    if engine is None:
+        return
+    if isinstance(engine, AsyncEngine):
+        await engine.dispose()
+    else:
+        await run_in_threadpool(engine.dispose)
@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from . import utils
+from .config import get_settings
+
+#-------------------------------------------------------------------------------
+# Bounded process pool for bcrypt
+#-------------------------------------------------------------------------------
+# bcrypt costs ~250ms of CPU per call. Running it in worker processes keeps it
+# off the event loop and the threadpool, and bounding the number of jobs in
+# flight turns a login burst into fast 503s instead of a stalled server.
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the parent holds pooled DB connections and threads
+        _executor = ProcessPoolExecutor(
+            max_workers=get_settings().PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def queue_limit() -> int:
+    """
+    Password jobs allowed in flight.
+
+    Each finished login then writes its tokens, so the limit stays within the
+    connection pool: a login burst cannot take every connection from the
+    other endpoints.
+    """
+    settings = get_settings()
+    return min(settings.PASSWORD_HASH_QUEUE_SIZE, settings.DATABASE_POOL_SIZE)
+
+
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= queue_limit():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many password operations in progress, retry later",
+                            headers={"Retry-After": "1"})
+    loop = asyncio.get_running_loop()
+    future = _get_executor().submit(fn, *args)
+    _pending += 1
+    # Counted until the job itself ends: a request cancelled by a client
+    # disconnect stops waiting, but a job already running keeps its worker
+    future.add_done_callback(lambda _: _call_in_loop(loop, _release))
+    return await asyncio.wrap_future(future)
+
+
+def _release():
+    global _pending
+    _pending -= 1
+
+
+def _call_in_loop(loop: asyncio.AbstractEventLoop, callback):
+    # Done callbacks run in the executor's thread; the counter belongs to the loop
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        # The loop is closed, nothing is counting anymore
+        pass
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password in the hashing pool."""
+    return await _submit(utils.hash_password, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password in the hashing pool.
+
+    Returns whether the password matches and, when the stored hash uses
+    outdated settings, the replacement hash to persist.
+    """
+    return await _submit(utils.verify_and_update_password, plain_password, hashed_password)
+
+
+def pending() -> int:
+    """Number of password jobs queued or running."""
+    return _pending
+
+
+def shutdown():
+    """Stop the worker processes, if they were started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
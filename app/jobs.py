@@ -0,0 +1,233 @@
+import asyncio
+import contextvars
+import logging
+import time
+from datetime import timedelta
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import get_settings
+from .database import session_scope
+from .metrics import JOB_DURATION, JOB_LAG, JOBS
+
+logger = logging.getLogger(__name__)
+
+#-------------------------------------------------------------------------------
+# Handlers
+#-------------------------------------------------------------------------------
+# Event kinds emitted by the endpoints. Attaching a side effect to a write is
+# registering a handler for its kind; nothing is written to the outbox for a
+# kind that has none.
+POST_CREATED = "post_created"
+POST_UPDATED = "post_updated"
+POST_DELETED = "post_deleted"
+VOTE_CHANGED = "vote_changed"
+USER_REGISTERED = "user_registered"
+
+Handler = Callable[[dict], Awaitable[None]]
+HANDLERS: Dict[str, List[Tuple[Handler, Optional[Callable[[], bool]]]]] = {}
+
+
+def handler(kind: str, when: Optional[Callable[[], bool]] = None):
+    """
+    Register a coroutine function run with the payload of every job of ``kind``.
+
+    ``when``, checked each time, disables the handler while it returns False,
+    for side effects that only some configurations need. Delivery is at least
+    once: a job whose worker died or whose handler failed runs again, so
+    handlers must be idempotent.
+    """
+    def decorator(fn: Handler) -> Handler:
+        HANDLERS.setdefault(kind, []).append((fn, when))
+        return fn
+    return decorator
+
+
+def handlers(kind: str) -> List[Handler]:
+    """The enabled handlers of ``kind``."""
+    return [fn for fn, when in HANDLERS.get(kind, ()) if when is None or when()]
+
+
+def listened(kind: str) -> bool:
+    return bool(handlers(kind))
+
+
+def listened_kinds() -> List[str]:
+    return [kind for kind in HANDLERS if listened(kind)]
+
+#-------------------------------------------------------------------------------
+# Outbox writes
+#-------------------------------------------------------------------------------
+def enqueue(db, kind: str, payload: dict):
+    """
+    Add a job to the session, committed or rolled back with the caller's write.
+
+    Workers of this process are woken once the transaction commits.
+    """
+    if not listened(kind):
+        return
+    db.add(models.OutboxJob(kind=kind, payload=payload))
+    wake_on_commit(db)
+
+
+def wake_on_commit(db):
+    """Wake the workers once the session's transaction commits, for jobs inserted by its statements."""
+    db.sync_session.info["jobs_enqueued"] = True
+
+
+def enqueue_from(kind: str, payloads):
+    """
+    INSERT of one job per row of ``payloads``, a select of one JSONB column, to
+    run as a CTE of the write statement itself, or after it in its transaction.
+    None if nobody listens.
+    """
+    if not listened(kind):
+        return None
+    # Server defaults only: Python ones are not bound when the INSERT is a CTE
+    # of a SELECT
+    return insert(models.OutboxJob).from_select(
+        ["kind", "payload"], select(literal(kind), payloads.subquery().c[0]), include_defaults=False
+    ).returning(models.OutboxJob.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("jobs_enqueued", False):
+        get_job_worker().wake()
+
+#-------------------------------------------------------------------------------
+# Worker pool
+#-------------------------------------------------------------------------------
+class JobWorker:
+    """
+    Asyncio tasks running the outbox jobs of this process.
+
+    Each task claims a batch with ``FOR UPDATE SKIP LOCKED``, so any number of
+    processes can share the table, and leases it: a job not finished within
+    ``lease`` seconds, e.g. because its worker died, is claimed again. A failed
+    job is retried after an exponential backoff and given up after
+    ``max_attempts``, keeping its last error. Tasks sleep until a commit in this
+    process enqueues a job, or ``poll_interval`` for jobs of other processes.
+    """
+
+    def __init__(self, concurrency: int, batch_size: int, poll_interval: float, lease: float, max_attempts: int):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def wake(self):
+        """Have idle tasks poll now. Safe to call from any thread."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _claim_statement(self):
+        table = models.OutboxJob
+        due = (select(table.id)
+               .where(table.available_at <= func.now(), table.failed_at.is_(None), table.kind.in_(listened_kinds()))
+               .order_by(table.available_at)
+               .limit(self.batch_size)
+               .with_for_update(skip_locked=True))
+        return (update(table)
+                .where(table.id.in_(due.scalar_subquery()))
+                .values(attempts=table.attempts + 1, available_at=func.now() + timedelta(seconds=self.lease))
+                .returning(table.id, table.kind, table.payload, table.attempts, table.created_at))
+
+    async def _claim(self):
+        async with session_scope() as db:
+            jobs = (await db.execute(self._claim_statement(), execution_options={"synchronize_session": False})).all()
+            await db.commit()
+        return jobs
+
+    async def _run(self, job) -> Optional[str]:
+        """Run the handlers of a job and return the error, if any."""
+        JOB_LAG.observe(job.kind, seconds=max(0.0, time.time() - job.created_at.timestamp()))
+        started = time.perf_counter()
+        try:
+            for fn in handlers(job.kind):
+                await fn(job.payload)
+        except Exception as exc:
+            logger.warning("Job %s (%s) failed on attempt %d", job.id, job.kind, job.attempts, exc_info=True)
+            return f"{type(exc).__name__}: {exc}"
+        finally:
+            JOB_DURATION.observe(job.kind, seconds=time.perf_counter() - started)
+        return None
+
+    async def _settle(self, done: List[int], failed: List[tuple]):
+        table = models.OutboxJob
+        async with session_scope() as db:
+            if done:
+                await db.execute(delete(table).where(table.id.in_(done)))
+            for job, error in failed:
+                if job.attempts >= self.max_attempts:
+                    values = {"failed_at": func.now(), "last_error": error}
+                else:
+                    backoff = timedelta(seconds=min(2 ** job.attempts, 300))
+                    values = {"available_at": func.now() + backoff, "last_error": error}
+                await db.execute(update(table).where(table.id == job.id).values(**values))
+            await db.commit()
+
+    async def _work(self):
+        while True:
+            # Cleared before claiming, so a job enqueued meanwhile still wakes the task
+            self._wakeup.clear()
+            try:
+                jobs = await self._claim()
+            except Exception:
+                logger.warning("Claiming outbox jobs failed", exc_info=True)
+                jobs = []
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            done, failed = [], []
+            for job in jobs:
+                error = await self._run(job)
+                if error is None:
+                    done.append(job.id)
+                    JOBS.inc(job.kind, "done")
+                else:
+                    failed.append((job, error))
+                    JOBS.inc(job.kind, "failed" if job.attempts >= self.max_attempts else "retried")
+            try:
+                await self._settle(done, failed)
+            except Exception:
+                # The lease runs out and the batch is claimed again
+                logger.warning("Settling outbox jobs failed", exc_info=True)
+
+    def start(self):
+        # A process without handlers has nothing to run, and must not claim other processes' jobs
+        if self._tasks or self.concurrency == 0 or not listened_kinds():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # Detached from the context of whoever starts them, like the vote buffer flushes
+        self._tasks = [contextvars.Context().run(asyncio.ensure_future, self._work()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        """Stop the tasks; jobs claimed but not settled run again once their lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+
+@lru_cache
+def get_job_worker() -> JobWorker:
+    """The app's worker pool, sized by the settings on first use."""
+    settings = get_settings()
+    return JobWorker(settings.JOBS_WORKERS, settings.JOBS_BATCH_SIZE, settings.JOBS_POLL_SECONDS,
+                     settings.JOBS_LEASE_SECONDS, settings.JOBS_MAX_ATTEMPTS)
@@ -1,22 +1,70 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .router import poste, user, auth, vote
-from . import models, config
-from .database import engine
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from .router import poste, user, auth, vote, health
+from . import config, database, hashing, jobs, metrics, ranking, votes
+from .metrics import MetricsMiddleware
+from .poolmetrics import pool_metrics
+from .querycount import QueryBudgetMiddleware
+
+logger = logging.getLogger(__name__)
 
 
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = config.get_settings()
+    if settings.DATABASE_CREATE_TABLES:
+        try:
+            if not await database.create_all():
+                logger.info("alembic_version found, leaving the schema to migrations")
+        except Exception:
+            logger.warning("Creating the tables failed", exc_info=True)
+    try:
+        await database.warm_up(settings.DATABASE_POOL_WARMUP)
+    except Exception:
+        # /readyz keeps reporting unavailable until the database answers
+        logger.warning("Connection pool warm-up failed", exc_info=True)
+    ranking.get_top_posts().start()
+    jobs.get_job_worker().start()
+    health.get_readiness().started = True
+    yield
+    health.get_readiness().started = False
+    await ranking.get_top_posts().close()
+    vote_buffer = votes.get_vote_buffer()
+    if vote_buffer is not None:
+        await vote_buffer.close()
+    await jobs.get_job_worker().close()
+    await database.dispose()
+    hashing.shutdown()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(QueryBudgetMiddleware)
+# Added last so it wraps the budget check and times the whole request
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/healthcheck", tags=["Health Check"])
 def health_check():
-    print(config.settings)
     return {"status": "OK"}
 
+
+@app.get("/healthcheck/pool", tags=["Health Check"])
+def pool_health():
+    """Connection pool usage and timings, to size the pool against real load."""
+    return pool_metrics.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Request, SQL, pool and cache metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(poste.router)
 app.include_router(user.router)
 app.include_router(auth.router)
 app.include_router(vote.router)
+app.include_router(health.router)
 
 
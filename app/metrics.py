@@ -0,0 +1,208 @@
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from . import hashing
+from .oauth2 import get_token_cache
+from .poolmetrics import Histogram, pool_metrics
+from .querycount import counting_statements
+
+#-------------------------------------------------------------------------------
+# Labelled metric families
+#-------------------------------------------------------------------------------
+# Upper bounds in seconds of request and per-request DB time histograms
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    A metric family: one value per combination of label values.
+
+    Updates come from the event loop and, for SQL hooks in sync mode, from
+    threadpool workers, so they go through a lock.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in items]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class LabelledHistogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels: str, seconds: float):
+        with self._lock:
+            histogram = self._values.get(labels)
+            if histogram is None:
+                histogram = self._values[labels] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, histogram.snapshot()) for labels, histogram in self._values.items()]
+        lines = self._header()
+        for labels, snapshot in items:
+            lines.extend(render_histogram(self.name, self.labelnames, labels, snapshot))
+        return lines
+
+
+def render_histogram(name: str, labelnames: Sequence[str], labels: Sequence[str], snapshot: dict) -> List[str]:
+    """Exposition lines of a ``Histogram.snapshot()``."""
+    buckets = list(snapshot["buckets"].items()) + [("+Inf", snapshot["count"])]
+    lines = [f"{name}_bucket{_labels(tuple(labelnames) + ('le',), tuple(labels) + (bound,))} {count}"
+             for bound, count in buckets]
+    lines.append(f"{name}_sum{_labels(labelnames, labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_labels(labelnames, labels)} {snapshot['count']}")
+    return lines
+
+#-------------------------------------------------------------------------------
+# Registry
+#-------------------------------------------------------------------------------
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+REQUEST_DURATION = LabelledHistogram("http_request_duration_seconds", "Time to serve a request, body included",
+                                     ("method", "route"))
+IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being served", ("method",))
+DB_STATEMENTS = Counter("http_request_db_statements_total", "SQL statements run on behalf of each route",
+                        ("method", "route"))
+DB_DURATION = LabelledHistogram("http_request_db_duration_seconds", "Time a request spent executing SQL statements",
+                                ("method", "route"))
+
+JOBS = Counter("outbox_jobs_total", "Outbox jobs run, by kind and outcome (done, retried, failed)", ("kind", "outcome"))
+JOB_DURATION = LabelledHistogram("outbox_job_duration_seconds", "Time the handlers of a job took", ("kind",))
+JOB_LAG = LabelledHistogram("outbox_job_lag_seconds", "Time from the write that enqueued a job to its run", ("kind",),
+                            buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+METRICS: List[Metric] = [REQUESTS, REQUEST_DURATION, IN_PROGRESS, DB_STATEMENTS, DB_DURATION, JOBS, JOB_DURATION, JOB_LAG]
+
+
+def _process_metrics() -> List[str]:
+    """State owned by other modules, read at scrape time."""
+    pool = pool_metrics.stats()
+    tokens = get_token_cache().stats()
+    lines = []
+
+    def sample(name, kind, documentation, value):
+        lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"])
+
+    sample("db_pool_size", "gauge", "Connections the pool keeps open", pool["size"])
+    sample("db_pool_checked_out", "gauge", "Connections currently checked out", pool["checked_out"])
+    sample("db_pool_overflow", "gauge", "Connections open beyond the pool size (negative: not yet opened)", pool["overflow"])
+    sample("db_pool_peak_checked_out", "gauge", "Most connections checked out at once", pool["peak_checked_out"])
+    sample("db_pool_checkouts_total", "counter", "Connection checkouts", pool["checkouts"])
+    sample("db_pool_checkout_timeouts_total", "counter", "Checkouts that gave up waiting", pool["checkout_timeouts"])
+    sample("db_pool_connects_total", "counter", "Database connections opened", pool["connects"])
+    sample("db_pool_invalidations_total", "counter", "Connections invalidated", pool["invalidations"])
+    sample("db_pool_soft_invalidations_total", "counter", "Connections soft-invalidated", pool["soft_invalidations"])
+    for name, key, documentation in (
+            ("db_pool_checkout_wait_seconds", "checkout_wait_seconds", "Wait for a pooled connection"),
+            ("db_pool_connect_seconds", "connect_latency_seconds", "Time to open a database connection")):
+        lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} histogram"])
+        lines.extend(render_histogram(name, (), (), pool[key]))
+    sample("token_cache_hits_total", "counter", "Access tokens served from the cache", tokens["hits"])
+    sample("token_cache_misses_total", "counter", "Access tokens decoded and verified", tokens["misses"])
+    sample("token_cache_entries", "gauge", "Access tokens in the cache", tokens["size"])
+    sample("password_hash_jobs_in_flight", "gauge", "Password hash and verify jobs queued or running", hashing.pending())
+    return lines
+
+
+COLLECTORS: List[Callable[[], List[str]]] = [_process_metrics]
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for collect in COLLECTORS:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+#-------------------------------------------------------------------------------
+# Request instrumentation middleware
+#-------------------------------------------------------------------------------
+class MetricsMiddleware:
+    """
+    Record latency, status and SQL work of every HTTP request, per route.
+
+    Routes are labelled with their path template (``/posts/{id}``), never the
+    raw path, to keep the number of series bounded. Statement count and DB
+    time come from the ``querycount`` hooks, shared with the budget check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_PROGRESS.inc(method)
+        started = time.perf_counter()
+        try:
+            with counting_statements() as counter:
+                await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_PROGRESS.dec(method)
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            REQUESTS.inc(method, route, str(status_code))
+            REQUEST_DURATION.observe(method, route, seconds=elapsed)
+            if counter.count:
+                DB_STATEMENTS.inc(method, route, amount=counter.count)
+                DB_DURATION.observe(method, route, seconds=counter.seconds)
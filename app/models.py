@@ -1,11 +1,17 @@
 import uuid
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Column, Computed, DDL, Integer, String, Text, Boolean, ForeignKey, Index, event
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from .database import Base
 
+# Text search configuration shared by the search_vector column and the queries
+SEARCH_CONFIG = "english"
+
+# The trigram index on post.title needs pg_trgm (a trusted extension since PostgreSQL 13)
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 # --------------------------
 # Modèle pour les posts 
 # -------------------------
@@ -15,16 +21,35 @@ class Post(Base):
     """
     __tablename__= "post" 
 
-    id = Column(Integer, primary_key=True, index=True, nullable=False, autoincrement=True, comment="Unique identifier of the post")
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True, comment="Unique identifier of the post")
     title = Column(String(200), nullable=False, comment="Title of the post")
     content = Column(String, nullable=False, comment="Content of the post")
     published = Column(Boolean, default=True, nullable=False, comment="Publication status of the post")
     rating = Column(Integer, nullable=True, comment="Rating of the post")
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
     owner_id  = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="Identifier of the user who created the post")
+    votes_count = Column(Integer, nullable=False, default=0, server_default=text('0'), comment="Number of votes on the post, maintained by the vote endpoint")
+    version = Column(Integer, nullable=False, default=1, server_default=text('1'), comment="Incremented by every update, for optimistic concurrency control")
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+                 f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')", persisted=True),
+        comment="Full-text search document of the post, title weighted above content"))
 
 
-    owner = relationship("User", back_populates="posts")
+    # Endpoints load the owner explicitly; an unplanned lazy load is an N+1 bug
+    owner = relationship("User", back_populates="posts", lazy="raise_on_sql")
+
+    __table_args__ = (
+        # Keyset pagination of GET /posts/ walks this index instead of sorting the table
+        Index("ix_post_created_at_id", created_at.desc(), id.desc()),
+        # Posts of a user, and the cascade when a user is deleted
+        Index("ix_post_owner_id", owner_id),
+        # Full-text matching for the search parameter
+        Index("ix_post_search_vector", search_vector.columns[0], postgresql_using="gin"),
+        # Substring (ILIKE) fallback for search terms the text parser does not keep
+        Index("ix_post_title_trgm", title, postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
 
 # --------------------------
 # Modèle pour les utilisateurs  
@@ -35,7 +60,7 @@ class User(Base):
     """
     __tablename__= "users"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True, nullable=False, comment="Unique identifier of the user")
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False, comment="Unique identifier of the user")
     email = Column(String, unique=True, nullable=False, index=True, comment="Email address of the user")
     password = Column(String, nullable=False, comment="Hashed password of the user")
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
@@ -53,4 +78,66 @@ class Vote(Base):
 
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, nullable=False, comment="Identifier of the user who voted")
     post_id = Column(Integer, ForeignKey("post.id", ondelete="CASCADE"), primary_key=True, nullable=False, comment="Identifier of the post that was voted on")
-    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
\ No newline at end of file
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+    __table_args__ = (
+        # The primary key leads with user_id; lookups by post (cascade deletes,
+        # counter reconciliation) need their own index
+        Index("ix_votes_post_id", post_id),
+    )
+
+# --------------------------
+# Modèle pour les votes par post et par heure
+# --------------------------
+class PostVoteBucket(Base):
+    """
+    Docstring for PostVoteBucket
+    """
+    __tablename__= "post_vote_buckets"
+
+    post_id = Column(Integer, ForeignKey("post.id", ondelete="CASCADE"), primary_key=True, nullable=False, comment="Identifier of the post")
+    bucket_start = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False, comment="Start of the UTC hour the votes were cast in")
+    votes = Column(Integer, nullable=False, comment="Votes cast in the hour and still standing, maintained by the vote endpoint")
+
+    __table_args__ = (
+        # The ranking sums the buckets of a time window and prunes the expired ones
+        Index("ix_post_vote_buckets_bucket_start", bucket_start),
+    )
+
+# --------------------------
+# Modèle pour les refresh tokens
+# --------------------------
+class RefreshToken(Base):
+    """
+    Docstring for RefreshToken
+    """
+    __tablename__= "refresh_tokens"
+
+    token_hash = Column(String(64), primary_key=True, nullable=False, comment="SHA-256 hex digest of the refresh token, the token itself is never stored")
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True, comment="Identifier of the user the token was issued to")
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False, comment="Time after which the token is refused")
+    revoked_at = Column(TIMESTAMP(timezone=True), nullable=True, comment="Time the token was used, replaced or revoked, null while valid")
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+# --------------------------
+# Modèle pour les tâches de l'outbox
+# --------------------------
+class OutboxJob(Base):
+    """
+    Docstring for OutboxJob
+    """
+    __tablename__= "outbox_jobs"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True, nullable=False, comment="Unique identifier of the job")
+    kind = Column(String(64), nullable=False, comment="Event kind, selects the handlers that run the job")
+    payload = Column(JSONB, nullable=False, comment="Arguments of the handlers")
+    attempts = Column(Integer, nullable=False, default=0, server_default=text('0'), comment="Times the job was claimed")
+    available_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'), comment="Time from which the job can be claimed, pushed back by leases and retries")
+    last_error = Column(Text, nullable=True, comment="Error of the last failed run")
+    failed_at = Column(TIMESTAMP(timezone=True), nullable=True, comment="Time the job was given up, after its last attempt")
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+    __table_args__ = (
+        # Workers claim the due jobs in order; given up jobs stay out of the index
+        Index("ix_outbox_jobs_available_at", available_at, postgresql_where=failed_at.is_(None)),
+    )
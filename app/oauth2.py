@@ -1,16 +1,108 @@
 
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
 from . import schemas
 from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from .config import settings
+from .config import get_settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-SECRET_KEY = settings.SECRET_KEY
-ALGORITHM = settings.ALGORITHM
-ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+#-------------------------------------------------------------------------------
+# Signing keys
+#-------------------------------------------------------------------------------
+# Key set built once, on first use: tokens name their key in the ``kid`` header,
+# so verifying one is a dict lookup and an HMAC whichever key signed it. To
+# rotate, move the current kid and secret to PREVIOUS_SIGNING_KEYS and set a new
+# SECRET_KEY and SIGNING_KEY_ID; drop the old key once its tokens have expired.
+@lru_cache
+def signing_keys() -> Dict[str, str]:
+    settings = get_settings()
+    return {**settings.PREVIOUS_SIGNING_KEYS, settings.SIGNING_KEY_ID: settings.SECRET_KEY}
+
+#-------------------------------------------------------------------------------
+# Verified token cache
+#-------------------------------------------------------------------------------
+class TokenCache:
+    """
+    Bounded LRU cache of verified access tokens.
+
+    Keys are SHA-256 digests of the raw token, values the decoded ``TokenData``
+    together with the token's ``exp``, after which the entry is dropped. The
+    cache is shared by the threadpool workers running ``get_current_user``, so
+    every access goes through a lock.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, token_data: schemas.TokenData, expires_at: float):
+        if self.maxsize <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (token_data, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        """Forget a single token, e.g. on logout."""
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def invalidate_user(self, user_id):
+        """Forget every cached token of a user."""
+        with self._lock:
+            for key in [k for k, (data, _) in self._entries.items() if data.user_id == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+@lru_cache
+def get_token_cache() -> TokenCache:
+    return TokenCache(get_settings().TOKEN_CACHE_SIZE)
 
 #-------------------------------------------------------------------------------
 # Function to create access token
@@ -22,16 +114,34 @@ def create_access_token(data: dict):
     :param data: Description
     :type data: dict
     """
-    to_encode = data.copy()
+    settings = get_settings()
+    now = int(time.time())
+    to_encode = {**data, "iat": now, "nbf": now, "exp": now + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60}
 
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    to_encode.update({"iat": datetime.utcnow()})
-    to_encode.update({"nbf": datetime.utcnow()})
-
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    from jose import jwt  # deferred: python-jose is slow to import, load it with the first token
+    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM,
+                             headers={"kid": settings.SIGNING_KEY_ID})
     return encoded_jwt
 
+#-------------------------------------------------------------------------------
+# Refresh tokens
+#-------------------------------------------------------------------------------
+def hash_refresh_token(token: str) -> str:
+    """
+    Digest under which a refresh token is stored and looked up.
+
+    Refresh tokens are 256 random bits, so a plain SHA-256 is enough to keep a
+    database leak from exposing usable tokens, without a password hash's cost.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def new_refresh_token() -> Tuple[str, str, datetime]:
+    """Return a new opaque refresh token, its digest and its expiry time."""
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=get_settings().REFRESH_TOKEN_EXPIRE_DAYS)
+    return token, hash_refresh_token(token), expires_at
+
 #-------------------------------------------------------------------------------
 # Function to verify access token   
 #-------------------------------------------------------------------------------
@@ -43,15 +153,29 @@ def verify_access_token(token: str, credentials_exception):
     :type token: str
     :param credentials_exception: Description
     """
+    token_cache = get_token_cache()
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
+    settings = get_settings()
+    keys = signing_keys()
+    from jose import JWTError, jwt  # deferred, see create_access_token
     try:
-        payload = jwt.decode(token=token, key=SECRET_KEY, algorithms=[ALGORITHM])
+        # Tokens issued before key ids were introduced carry no kid. The header
+        # is not verified yet, so a kid that is not a known string is rejected.
+        kid = jwt.get_unverified_header(token).get("kid", settings.SIGNING_KEY_ID)
+        if not isinstance(kid, str) or kid not in keys:
+            raise credentials_exception
+        payload = jwt.decode(token=token, key=keys[kid], algorithms=[settings.ALGORITHM])
 
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
         token_data = schemas.TokenData(user_id=user_id)
-    except JWTError:
+    except (JWTError, AttributeError, TypeError, ValueError):
         raise credentials_exception
+    if "exp" in payload:
+        token_cache.put(token, token_data, payload["exp"])
     return token_data
 
 
@@ -0,0 +1,61 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+#-------------------------------------------------------------------------------
+# Opaque cursor encoding
+#-------------------------------------------------------------------------------
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key of the last row of a page into an opaque cursor."""
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """Decode a cursor back into values typed after the keyset columns."""
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise invalid_cursor
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise invalid_cursor
+
+    decoded = []
+    for column, value in zip(columns, values):
+        try:
+            python_type = column.type.python_type
+            decoded.append(datetime.fromisoformat(value) if python_type is datetime else python_type(value))
+        except (TypeError, ValueError):
+            raise invalid_cursor
+    return decoded
+
+#-------------------------------------------------------------------------------
+# Keyset pagination
+#-------------------------------------------------------------------------------
+def keyset(query, columns: Sequence[Any], cursor: Optional[str], limit: int):
+    """
+    Restrict a query to the page that follows ``cursor``.
+
+    Rows are ordered by ``columns`` descending, and one extra row is fetched so
+    that ``next_page`` can tell whether another page exists.
+    """
+    if cursor:
+        query = query.where(tuple_(*columns) < tuple_(*decode_cursor(cursor, columns)))
+    return query.order_by(*(column.desc() for column in columns)).limit(limit + 1)
+
+
+def next_page(rows: Sequence[Any], limit: int, key: Callable[[Any], Sequence[Any]]) -> Tuple[List[Any], Optional[str]]:
+    """Split the rows fetched by ``keyset`` into the page and the cursor of the next one."""
+    page = list(rows[:limit])
+    next_cursor = encode_cursor(key(page[-1])) if len(rows) > limit else None
+    return page, next_cursor
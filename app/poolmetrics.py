@@ -0,0 +1,144 @@
+import threading
+import time
+from typing import Sequence
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+#-------------------------------------------------------------------------------
+# Metric primitives
+#-------------------------------------------------------------------------------
+# Upper bounds in seconds, from an idle pool (microseconds) to a starved one
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative bucket counts of observed durations, as Prometheus expects them."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            # Keyed like Prometheus "le" labels; JSON objects need string keys anyway
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+#-------------------------------------------------------------------------------
+# Connection pool metrics
+#-------------------------------------------------------------------------------
+class PoolMetrics:
+    """
+    Counters and timings of the engine's connection pool.
+
+    Fed by the pool events and by ``TimedQueuePool``. Events fire from
+    threadpool workers in sync mode, so updates go through a lock.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.checkout_wait = Histogram()
+        self.connect_latency = Histogram()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.peak_checked_out = 0
+        self._lock = threading.Lock()
+
+    def observe_checkout_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkout_wait.observe(seconds)
+            if timed_out:
+                self.checkout_timeouts += 1
+
+    def instrument(self, engine):
+        """Listen to the events of ``engine`` (sync or async) and of its pool."""
+        sync_engine = self.engine = getattr(engine, "sync_engine", engine)
+
+        @event.listens_for(sync_engine, "do_connect")
+        def _timed_connect(dialect, conn_rec, cargs, cparams):
+            start = time.perf_counter()
+            connection = dialect.connect(*cargs, **cparams)
+            with self._lock:
+                self.connects += 1
+                self.connect_latency.observe(time.perf_counter() - start)
+            return connection
+
+        # dispose() replaces the pool with a copy that keeps these listeners
+        @event.listens_for(sync_engine.pool, "checkout")
+        def _checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.checkouts += 1
+                self.peak_checked_out = max(self.peak_checked_out, sync_engine.pool.checkedout())
+
+        @event.listens_for(sync_engine.pool, "invalidate")
+        def _invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+        @event.listens_for(sync_engine.pool, "soft_invalidate")
+        def _soft_invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.soft_invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            pool = self.engine.pool if self.engine is not None else None
+            return {
+                "size": pool.size() if pool is not None else 0,
+                "checked_out": pool.checkedout() if pool is not None else 0,
+                # Negative while the pool has not opened pool_size connections yet
+                "overflow": pool.overflow() if pool is not None else 0,
+                "peak_checked_out": self.peak_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "checkout_wait_seconds": self.checkout_wait.snapshot(),
+                "connect_latency_seconds": self.connect_latency.snapshot(),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+#-------------------------------------------------------------------------------
+# Pools timing their checkouts
+#-------------------------------------------------------------------------------
+class _TimedCheckout:
+    # Pool events fire once a connection is handed out, so the wait for a free
+    # slot (and the connect of a new one) can only be measured around _do_get
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection_record = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.observe_checkout_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.observe_checkout_wait(time.perf_counter() - start)
+        return connection_record
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
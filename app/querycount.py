@@ -0,0 +1,121 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+#-------------------------------------------------------------------------------
+# Per-request SQL statement counting
+#-------------------------------------------------------------------------------
+class StatementCounter:
+    """Number of statements executed on behalf of the current request, and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# The counter object is shared by reference, so statements run in threadpool
+# workers (sync mode) or greenlets (async mode) add to the request's total.
+_current_counter: contextvars.ContextVar[Optional[StatementCounter]] = contextvars.ContextVar(
+    "statement_counter", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.count += 1
+        if context is not None:
+            context._statement_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _time_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    started = getattr(context, "_statement_started", None)
+    if counter is not None and started is not None:
+        counter.seconds += time.perf_counter() - started
+
+
+@contextmanager
+def counting_statements():
+    """
+    Count the statements run by the enclosed code.
+
+    Nested uses share the outer counter, so several middlewares can each read
+    the totals of the same request.
+    """
+    counter = _current_counter.get()
+    if counter is not None:
+        yield counter
+        return
+    counter = StatementCounter()
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+def query_budget(max_statements: Union[int, Callable[[], int]]):
+    """
+    Declare how many SQL statements an endpoint may run per request.
+
+    Put it under the route decorator. ``QueryBudgetMiddleware`` checks the
+    budget on every request that reaches the endpoint. A budget that depends
+    on the settings is given as a function, called at check time.
+    """
+    def decorator(endpoint):
+        endpoint.query_budget = max_statements
+        return endpoint
+    return decorator
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+#-------------------------------------------------------------------------------
+# Budget enforcement middleware
+#-------------------------------------------------------------------------------
+class QueryBudgetMiddleware:
+    """
+    Count the statements of each request and compare them with the endpoint's budget.
+
+    An endpoint over budget, typically after an N+1 lazy load sneaks in, is
+    logged. With ``enforce=True`` (test runs), ``QueryBudgetExceeded`` is
+    raised once the response is sent, which fails the calling test client.
+    ``enforce=None`` follows ``QUERY_BUDGET_ENFORCE``.
+    """
+
+    def __init__(self, app, enforce: Optional[bool] = None):
+        self.app = app
+        self.enforce = enforce
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with counting_statements() as counter:
+            start_count = counter.count
+            await self.app(scope, receive, send)
+        count = counter.count - start_count
+
+        budget = getattr(scope.get("endpoint"), "query_budget", None)
+        if callable(budget):
+            budget = budget()
+        if budget is not None and count > budget:
+            message = (f"{scope['method']} {scope['path']} ran {count} SQL statements, "
+                       f"its budget is {budget}")
+            enforce = self.enforce if self.enforce is not None else get_settings().QUERY_BUDGET_ENFORCE
+            if enforce:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+import logging
+import time
+from datetime import timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from . import models, schemas
+from .config import get_settings
+from .database import session_scope
+from .votes import vote_bucket
+
+logger = logging.getLogger(__name__)
+
+#-------------------------------------------------------------------------------
+# Top posts by votes over a time window
+#-------------------------------------------------------------------------------
+# Windows served by GET /posts/top. Votes are rolled up per UTC hour, so a window
+# covers its last whole hours plus the current one.
+WINDOWS = {"1h": timedelta(hours=1), "24h": timedelta(hours=24), "7d": timedelta(days=7)}
+
+# Buckets older than the longest window no longer count for any ranking; they
+# are pruned by ``python -m app.reconcile``, not by every worker's refresh
+RETENTION = max(WINDOWS.values())
+
+POST_OUT = TypeAdapter(schemas.PostOut)
+
+
+class TopPosts:
+    """
+    Precomputed ranking of the most voted posts per window.
+
+    The vote statements keep ``post_vote_buckets`` up to date; every
+    ``interval`` seconds a background task sums the buckets of each window,
+    keeps the ``size`` best posts and stores their serialized ``PostOut`` items.
+    Serving a page is then a slice and a join of bytes, without SQL. A vote
+    shows in the ranking within one interval. Each worker keeps its own copy.
+    """
+
+    def __init__(self, size: int, interval: float):
+        self.size = size
+        self.interval = interval
+        self.refreshed_at: Optional[float] = None
+        self._items: Dict[str, List[bytes]] = {window: [] for window in WINDOWS}
+        self._task: Optional[asyncio.Task] = None
+
+    def page(self, window: str, limit: int) -> bytes:
+        """JSON array of the ``limit`` first posts of a window."""
+        return b"[" + b",".join(self._items[window][:limit]) + b"]"
+
+    async def refresh(self):
+        """Recompute every window from the rollup and swap the results in."""
+        current_bucket = vote_bucket(func.now())
+        async with session_scope() as db:
+            ranked = {}
+            for window, length in WINDOWS.items():
+                total = func.sum(models.PostVoteBucket.votes).label("votes")
+                ranked[window] = (await db.execute(
+                    select(models.PostVoteBucket.post_id, total)
+                    .where(models.PostVoteBucket.bucket_start >= current_bucket - length)
+                    .group_by(models.PostVoteBucket.post_id)
+                    .having(total > 0)
+                    .order_by(total.desc(), models.PostVoteBucket.post_id.desc())
+                    .limit(self.size))).all()
+
+            post_ids = {row.post_id for rows in ranked.values() for row in rows}
+            posts = {}
+            if post_ids:
+                posts = {post.id: post for post in await db.scalars(
+                    select(models.Post).options(joinedload(models.Post.owner, innerjoin=True))
+                    .where(models.Post.id.in_(post_ids)))}
+
+        items = {}
+        for window, rows in ranked.items():
+            # A post deleted since the buckets were summed is left out
+            items[window] = [POST_OUT.dump_json(POST_OUT.validate_python(
+                                 {"Post": posts[row.post_id], "votes": row.votes}, from_attributes=True))
+                             for row in rows if row.post_id in posts]
+        self._items = items
+        self.refreshed_at = time.time()
+
+    async def _run(self):
+        # The first refresh runs in the background too: until it is done, pages
+        # are empty rather than the worker slow to start
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # The previous ranking keeps being served until a refresh succeeds
+                logger.warning("Top posts refresh failed", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            # Run detached from the context of whoever starts it, like the vote buffer flushes
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+@lru_cache
+def get_top_posts() -> TopPosts:
+    settings = get_settings()
+    return TopPosts(settings.RANKING_SIZE, settings.RANKING_REFRESH_SECONDS)
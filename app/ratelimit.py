@@ -0,0 +1,160 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from . import oauth2, schemas
+from .config import get_settings
+
+#-------------------------------------------------------------------------------
+# Sliding window counters
+#-------------------------------------------------------------------------------
+# Each key counts its hits in fixed windows. The rate over the last `window`
+# seconds is estimated as the current count plus the previous window's count
+# weighted by how much of it still overlaps, which smooths bursts at window
+# edges with two integers per key. Every attempt counts, rejected ones
+# included, so hammering a key keeps it locked out.
+def _sliding_estimate(previous: int, current: int, now: float, window: float) -> float:
+    overlap = 1 - (now % window) / window
+    return previous * overlap + current
+
+
+class RateLimitBackend:
+    """
+    Interface of the rate limiter storage.
+
+    ``hit`` records an attempt on a key and returns whether it is within
+    ``limit`` attempts per ``window`` seconds, and if not, how many seconds to
+    wait. Backends are async so a networked store can implement them.
+    """
+
+    async def hit(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        raise NotImplementedError
+
+
+class NullRateLimiter(RateLimitBackend):
+    """Limiter that allows everything, used when rate limiting is disabled."""
+
+    async def hit(self, key, limit, window):
+        return True, 0.0
+
+
+class MemoryRateLimiter(RateLimitBackend):
+    """
+    In-process sliding window counters, one LRU entry per key.
+
+    Only touched from the event loop, so it needs no lock. Each worker counts
+    on its own, so the effective limit is multiplied by the number of
+    workers; use the redis backend to share the counters.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    async def hit(self, key, limit, window):
+        now = time.time()
+        index = int(now // window)
+        entry_index, previous, current = self._entries.get(key, (index, 0, 0))
+        if entry_index == index - 1:
+            previous, current = current, 0
+        elif entry_index != index:
+            previous, current = 0, 0
+        current += 1
+        self._entries[key] = (index, previous, current)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        if _sliding_estimate(previous, current, now, window) <= limit:
+            return True, 0.0
+        return False, window - now % window
+
+
+class RedisRateLimiter(RateLimitBackend):
+    """Sliding window counters in Redis, shared by every worker. Takes a ``redis.asyncio`` compatible client."""
+
+    def __init__(self, client, prefix: str = "fastapi_post:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def hit(self, key, limit, window):
+        now = time.time()
+        index = int(now // window)
+        current_key = f"{self.prefix}{key}:{index}"
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.incr(current_key)
+            pipe.pexpire(current_key, int(window * 2000))
+            pipe.get(f"{self.prefix}{key}:{index - 1}")
+            current, _, previous = await pipe.execute()
+
+        if _sliding_estimate(int(previous or 0), int(current), now, window) <= limit:
+            return True, 0.0
+        return False, window - now % window
+
+
+@lru_cache
+def get_rate_limiter() -> RateLimitBackend:
+    """The backend chosen by the settings, built on first use."""
+    settings = get_settings()
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        # redis is only needed by deployments that choose this backend
+        from redis import asyncio as redis
+        return RedisRateLimiter(redis.from_url(settings.REDIS_URL))
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimiter(settings.RATE_LIMIT_MAX_KEYS)
+    return NullRateLimiter()
+
+#-------------------------------------------------------------------------------
+# Limits
+#-------------------------------------------------------------------------------
+def client_ip(request: Request) -> str:
+    """
+    Address of the client.
+
+    Behind a reverse proxy, run uvicorn with ``--proxy-headers`` and
+    ``--forwarded-allow-ips`` so this is the real client, not the proxy.
+    """
+    return request.client.host if request.client else "unknown"
+
+
+def _digest(value: str) -> str:
+    # Keys must not expose emails in a shared store
+    return hashlib.sha256(value.strip().lower().encode()).hexdigest()[:32]
+
+
+async def enforce(key: str, limit: int):
+    """Count an attempt on ``key`` and answer 429 once it goes over ``limit`` per window. A limit of 0 disables it."""
+    if limit <= 0:
+        return
+    allowed, retry_after = await get_rate_limiter().hit(key, limit, get_settings().RATE_LIMIT_WINDOW_SECONDS)
+    if not allowed:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            detail="Too many attempts, retry later",
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+async def limit_login(request: Request, email: str):
+    """Limit login attempts per client address and per targeted email, before any DB or bcrypt work."""
+    settings = get_settings()
+    await enforce(f"login:ip:{client_ip(request)}", settings.RATE_LIMIT_LOGIN_PER_IP)
+    await enforce(f"login:email:{_digest(email)}", settings.RATE_LIMIT_LOGIN_PER_EMAIL)
+
+
+async def limit_registration(request: Request):
+    """Dependency limiting account creation, which costs a bcrypt hash, per client address."""
+    await enforce(f"register:ip:{client_ip(request)}", get_settings().RATE_LIMIT_REGISTER_PER_IP)
+
+
+async def limit_writes(current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    """Dependency limiting the mutating requests of each authenticated user."""
+    await enforce(f"writes:user:{current_user.user_id}", get_settings().RATE_LIMIT_WRITES_PER_USER)
+
+
+async def limit_anonymous_writes(request: Request):
+    """Dependency limiting the mutating requests of unauthenticated routes per client address."""
+    await enforce(f"writes:ip:{client_ip(request)}", get_settings().RATE_LIMIT_WRITES_PER_USER)
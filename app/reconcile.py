@@ -0,0 +1,60 @@
+"""
+Rebuild the denormalized counters from their source tables.
+
+Run it after bulk imports, manual SQL fixes, or user deletions, since those
+cascade to ``votes`` without going through the vote endpoint::
+
+    python -m app.reconcile
+
+``python -m app.reconcile --prune`` only drops the vote buckets that have left
+every ranking window; schedule it, e.g. hourly, from a single place.
+"""
+import sys
+
+from sqlalchemy import create_engine, delete, func, insert, select, update
+
+from . import models
+from .database import database_url
+from .ranking import RETENTION
+from .votes import vote_bucket
+
+
+def reconcile_votes_count(connection) -> int:
+    """Reset ``post.votes_count`` from ``votes`` and return how many posts had drifted."""
+    actual = select(func.count(models.Vote.post_id)).where(models.Vote.post_id == models.Post.id).scalar_subquery()
+    result = connection.execute(
+        update(models.Post).where(models.Post.votes_count != actual).values(votes_count=actual))
+    return result.rowcount
+
+
+def reconcile_vote_buckets(connection) -> int:
+    """Rebuild ``post_vote_buckets`` from the votes still in the ranking windows and return the bucket count."""
+    connection.execute(delete(models.PostVoteBucket))
+    bucket = vote_bucket(models.Vote.created_at)
+    result = connection.execute(insert(models.PostVoteBucket).from_select(
+        ["post_id", "bucket_start", "votes"],
+        select(models.Vote.post_id, bucket, func.count())
+        .where(models.Vote.created_at >= vote_bucket(func.now()) - RETENTION)
+        .group_by(models.Vote.post_id, bucket)))
+    return result.rowcount
+
+
+def prune_vote_buckets(connection) -> int:
+    """Delete the ``post_vote_buckets`` older than the longest ranking window and return how many."""
+    result = connection.execute(delete(models.PostVoteBucket).where(
+        models.PostVoteBucket.bucket_start < vote_bucket(func.now()) - RETENTION))
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    engine = create_engine(database_url())
+    if "--prune" in sys.argv[1:]:
+        with engine.begin() as connection:
+            pruned = prune_vote_buckets(connection)
+        print(f"post_vote_buckets pruned, {pruned} bucket(s) deleted")
+        sys.exit(0)
+    with engine.begin() as connection:
+        fixed = reconcile_votes_count(connection)
+        buckets = reconcile_vote_buckets(connection)
+    print(f"votes_count reconciled, {fixed} post(s) corrected")
+    print(f"post_vote_buckets rebuilt, {buckets} bucket(s)")
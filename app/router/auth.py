@@ -1,33 +1,105 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, status, Depends
+from fastapi.params import Body
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import models, utils, oauth2
+from .. import models, schemas, hashing, oauth2, ratelimit
+from ..config import get_settings
 from ..database import get_db
+from ..querycount import query_budget
 router = APIRouter( prefix="/auth" ,tags=["Authentication"])
 
+
+def _issue_tokens(db: AsyncSession, user_id) -> dict:
+    """Mint an access token and add a new refresh token to the session, stored as its digest."""
+    refresh_token, token_hash, expires_at = oauth2.new_refresh_token()
+    db.add(models.RefreshToken(token_hash=token_hash, user_id=user_id, expires_at=expires_at))
+    return {"access_token": oauth2.create_access_token(data={"sub": str(user_id)}), "token_type": "bearer",
+            "expires_in": get_settings().ACCESS_TOKEN_EXPIRE_MINUTES * 60, "refresh_token": refresh_token}
+
+
+def _revoke(token_hash: str):
+    """UPDATE revoking a still valid refresh token, returning its user id when there was one."""
+    return (update(models.RefreshToken)
+            .where(models.RefreshToken.token_hash == token_hash,
+                   models.RefreshToken.revoked_at.is_(None),
+                   models.RefreshToken.expires_at > func.now())
+            .values(revoked_at=func.now())
+            .returning(models.RefreshToken.user_id))
+
 #-------------------------------------------------------------------------------
 # User Login Endpoint
 #-------------------------------------------------------------------------------
-@router.post("/login",    
+@router.post("/login", response_model=schemas.Token,
              status_code= status.HTTP_200_OK, description="Authenticate a user and return user details",
              summary="User Login Endpoint", response_description="The authenticated user details")
-def login_user(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@query_budget(3)
+async def login_user(request: Request, user_credentials: OAuth2PasswordRequestForm = Depends(),
+                     db: AsyncSession = Depends(get_db)):
     """
     Docstring for login_user
     
     :param user_credentials: Description
     :type user_credentials: schemas.UserLogin
     :param db: Description
-    :type db: Session
+    :type db: AsyncSession
+
+    Attempts are rate limited per client address and per email before the
+    user lookup and bcrypt, so a guessing client is answered 429 cheaply.
+    The read transaction ends before bcrypt, so a login waiting for the
+    hashing pool holds no pooled connection; the rehash and the refresh
+    token are written in a new one.
     """
-    user = db.query(models.User).filter(models.User.email == user_credentials.username).first()
+    await ratelimit.limit_login(request, user_credentials.username)
+    user = (await db.execute(select(models.User.id, models.User.password)
+                             .where(models.User.email == user_credentials.username))).first()
+    await db.rollback()
     if not user:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
-    
-    if not utils.verify_password(user_credentials.password, user.password):
+
+    password_ok, new_hash = await hashing.verify_password(user_credentials.password, user.password)
+    if not password_ok:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
-    
-    access_token = oauth2.create_access_token(data = {"sub": str(user.id)})
 
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    if new_hash:
+        await db.execute(update(models.User).where(models.User.id == user.id).values(password=new_hash))
+    tokens = _issue_tokens(db, user.id)
+    await db.commit()
+    return tokens
+
+#-------------------------------------------------------------------------------
+# Token Refresh Endpoint
+#-------------------------------------------------------------------------------
+@router.post("/refresh", response_model=schemas.Token,
+             status_code=status.HTTP_200_OK, description="Exchange a refresh token for new access and refresh tokens",
+             dependencies=[Depends(ratelimit.limit_anonymous_writes)],
+             summary="Token Refresh Endpoint", response_description="The new tokens")
+@query_budget(2)
+async def refresh_tokens(payload: schemas.RefreshRequest = Body(...), db: AsyncSession = Depends(get_db)):
+    """
+    Renew a session without the password, hence without bcrypt.
+
+    Refresh tokens are single use: the presented one is revoked by the same
+    statement that checks it, and a new one is returned, so a replayed or
+    concurrently reused token is refused.
+    """
+    user_id = await db.scalar(_revoke(oauth2.hash_refresh_token(payload.refresh_token)))
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token")
+    tokens = _issue_tokens(db, user_id)
+    await db.commit()
+    return tokens
+
+#-------------------------------------------------------------------------------
+# Logout Endpoint
+#-------------------------------------------------------------------------------
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT, description="Revoke a refresh token",
+             dependencies=[Depends(ratelimit.limit_anonymous_writes)],
+             summary="Logout Endpoint", response_description="No content")
+@query_budget(1)
+async def logout(payload: schemas.RefreshRequest = Body(...), db: AsyncSession = Depends(get_db)):
+    """Revoke a refresh token. Access tokens already issued stay valid until they expire."""
+    await db.execute(_revoke(oauth2.hash_refresh_token(payload.refresh_token)))
+    await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+
+from fastapi import APIRouter, status
+from fastapi.responses import ORJSONResponse
+
+from .. import database
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Health Check"])
+
+
+class Readiness:
+    """
+    Cached database readiness of this worker.
+
+    Every orchestrator and load balancer replica probes every worker, so a
+    ping result is reused for ``ttl`` seconds, failures included, and
+    concurrent probes wait for the same ping. The database sees at most one
+    probe query per interval per worker, even while it is struggling.
+    """
+
+    def __init__(self, ttl: float, timeout: float):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.started = False
+        self._ok = False
+        self._checked_at = float("-inf")
+        self._lock = None
+
+    def _fresh(self) -> bool:
+        return time.monotonic() - self._checked_at < self.ttl
+
+    async def check(self) -> bool:
+        if not self.started:
+            return False
+        if self._fresh():
+            return self._ok
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._fresh():
+                try:
+                    await asyncio.wait_for(database.ping(), self.timeout)
+                    self._ok = True
+                except Exception:
+                    logger.warning("Readiness database ping failed", exc_info=True)
+                    self._ok = False
+                self._checked_at = time.monotonic()
+        return self._ok
+
+
+@lru_cache
+def get_readiness() -> Readiness:
+    settings = get_settings()
+    return Readiness(settings.READINESS_CACHE_SECONDS, settings.READINESS_TIMEOUT_SECONDS)
+
+#-------------------------------------------------------------------------------
+# Liveness Probe Endpoint
+#-------------------------------------------------------------------------------
+@router.get("/livez", status_code=status.HTTP_200_OK, summary="Liveness Probe Endpoint",
+            description="Answer as long as the worker's event loop runs, without any I/O")
+async def livez():
+    return {"status": "alive"}
+
+#-------------------------------------------------------------------------------
+# Readiness Probe Endpoint
+#-------------------------------------------------------------------------------
+@router.get("/readyz", status_code=status.HTTP_200_OK, summary="Readiness Probe Endpoint",
+            description="Answer 200 once started and while the database answers, 503 otherwise",
+            responses={503: {"description": "Starting, stopping, or the database is unreachable"}})
+async def readyz():
+    if await get_readiness().check():
+        return {"status": "ready"}
+    return ORJSONResponse({"status": "unavailable"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
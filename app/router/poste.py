@@ -1,91 +1,371 @@
-from fastapi import FastAPI, HTTPException, Response, status, Depends, APIRouter
+import csv
+import io
+import logging
+from datetime import datetime
+
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response, status, Depends, APIRouter, Query
 from fastapi.params import Body
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+
+from pydantic import TypeAdapter
+
+from sqlalchemy import Double, cast, delete, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from .. import models, schemas, oauth2, pagination, cache, jobs, ranking, ratelimit
+from ..querycount import query_budget
+from ..config import get_settings
+from ..database import get_db, session_scope
+from .vote import FOREIGN_KEY_VIOLATION
 
-from sqlalchemy import func
-from .. import models, schemas, oauth2
-from ..database import get_db   
-from sqlalchemy.orm import Session
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
+# Post responses nest the owner. It is a non-null many-to-one, so every
+# endpoint that returns posts joins it into the same statement.
+POST_WITH_OWNER = (joinedload(models.Post.owner, innerjoin=True),)
+
+# Serializes a page of rows to JSON bytes in pydantic-core, in one pass
+POST_PAGE = TypeAdapter(List[schemas.PostOut])
+
+
+async def invalidate_cached_post(post_id: int, retried: bool):
+    """
+    Drop the cached ``GET /posts/{id}`` response of a post, once its change is committed.
+
+    This runs in the process that handled the write, so its own cache, and the
+    next request of the same client, never serve the old body. When the cache
+    is shared, a job enqueued with the write (``retried``) retries a delete
+    that fails here.
+    """
+    try:
+        await cache.get_response_cache().delete(cache.post_key(post_id))
+    except Exception:
+        if not retried:
+            raise
+        logger.warning("Invalidating the cached post %s failed, left to its job", post_id, exc_info=True)
+
+
+@jobs.handler(jobs.POST_UPDATED, when=cache.shared)
+@jobs.handler(jobs.POST_DELETED, when=cache.shared)
+async def retry_cached_post_invalidation(payload: dict):
+    """Delete the cached post again, in case the delete of the write's process failed."""
+    await cache.get_response_cache().delete(cache.post_key(payload["post_id"]))
+
 #-------------------------------------------------------------------------------
 # Get All Posts Endpoint
 #-------------------------------------------------------------------------------
 @router.get("/", response_model=List[schemas.PostOut],
-            status_code=status.HTTP_200_OK, description="Retrieve all posts", 
+            status_code=status.HTTP_200_OK, description="Retrieve posts, newest first, one page at a time",
             summary="Get All Post Endpoint" ,response_description="List of posts")
-def get_posts(db:Session = Depends(get_db), limit: int = 10, skip: int = 0, search: Optional[str] = ""):
-    """Retrieve all posts from the database."""
-    posts = db.query(models.Post).filter(models.Post.title.contains(search)).limit(limit).offset(skip).all()
+@query_budget(1)
+async def get_posts(db: AsyncSession = Depends(get_db), limit: int = Query(10, ge=1, le=100),
+                    cursor: Optional[str] = None, search: Optional[str] = ""):
+    """
+    Retrieve a page of posts with their vote counts.
+
+    Vote counts come from the maintained ``post.votes_count`` column, so the
+    page is a single indexed query that never touches ``votes``. The cursor of
+    the next page, if any, is returned in the ``X-Next-Cursor`` header. The
+    rows are validated into ``PostOut`` and dumped to JSON by pydantic-core
+    directly, skipping the ``response_model`` round trip through Python dicts.
+
+    ``search`` uses web search syntax (quoted phrases, ``or``, ``-word``)
+    against the title and content, through the GIN-indexed ``search_vector``.
+    A substring of the title also matches, via the trigram index. Matches are
+    ranked by relevance, newest first among equals.
+    """
+    query = select(models.Post, models.Post.votes_count.label("votes")).options(*POST_WITH_OWNER)
+    key_columns = (models.Post.created_at, models.Post.id)
+    page_key = lambda row: (row.Post.created_at, row.Post.id)
+    if search:
+        terms = func.websearch_to_tsquery(cast(models.SEARCH_CONFIG, REGCONFIG), search)
+        # float8, not ts_rank's real: cursors must round-trip the rank exactly
+        rank = cast(func.ts_rank_cd(models.Post.search_vector, terms), Double)
+        query = query.add_columns(rank.label("rank")).where(or_(
+            models.Post.search_vector.bool_op("@@")(terms),
+            models.Post.title.icontains(search, autoescape=True)))
+        key_columns = (rank,) + key_columns
+        page_key = lambda row: (row.rank, row.Post.created_at, row.Post.id)
+
+    rows = (await db.execute(pagination.keyset(query, key_columns, cursor, limit))).all()
+    posts, next_cursor = pagination.next_page(rows, limit, key=page_key)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=POST_PAGE.dump_json(POST_PAGE.validate_python(posts, from_attributes=True)),
+                    media_type="application/json", headers=headers)
+
+#-------------------------------------------------------------------------------
+# Export Posts Endpoint
+#-------------------------------------------------------------------------------
+EXPORT_COLUMNS = (models.Post.id, models.Post.title, models.Post.content, models.Post.published, models.Post.rating,
+                  models.Post.created_at, models.Post.owner_id, models.Post.votes_count.label("votes"))
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+
+def _ndjson_chunk(rows) -> bytes:
+    # orjson writes datetimes and UUIDs itself; default covers asyncpg's own UUID type
+    return b"".join(orjson.dumps(dict(row._mapping), default=str) + b"\n" for row in rows)
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+# Declared before /{id}, which would otherwise capture "export"
+@router.get("/export", status_code=status.HTTP_200_OK, description="Stream every post with its vote count",
+            summary="Export Posts Endpoint", response_description="All posts as NDJSON or CSV, in id order",
+            responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}})
+@query_budget(1)
+async def export_posts(format: Literal["ndjson", "csv"] = Query("ndjson", description="Output format"),
+                       current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    """
+    Stream every post with its vote count, one row per line.
 
-    resultat = db.query(models.Post, func.count(models.Vote.post_id).label("votes")).join(
-        models.Vote, models.Vote.post_id == models.Post.id, isouter=True).group_by(models.Post.id)
-    return resultat
+    Rows come from a server-side cursor, ``POSTS_EXPORT_CHUNK_SIZE`` at a
+    time, and each chunk is written as soon as it is fetched: memory stays
+    flat and the first bytes leave right away, whatever the table size. The
+    session belongs to the stream, so it lives exactly as long as the body.
+    """
+    chunk_size = get_settings().POSTS_EXPORT_CHUNK_SIZE
+    statement = select(*EXPORT_COLUMNS).order_by(models.Post.id).execution_options(yield_per=chunk_size)
+
+    async def body():
+        if format == "csv":
+            yield _csv_chunk([EXPORT_FIELDS])
+        async with session_scope() as db:
+            result = await db.stream(statement)
+            async for rows in result.partitions(chunk_size):
+                yield _ndjson_chunk(rows) if format == "ndjson" else _csv_chunk(rows)
+
+    media_type, extension = ("application/x-ndjson", "ndjson") if format == "ndjson" else ("text/csv", "csv")
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="posts.{extension}"'})
+
+#-------------------------------------------------------------------------------
+# Top Posts Endpoint
+#-------------------------------------------------------------------------------
+@router.get("/top", response_model=List[schemas.PostOut],
+            status_code=status.HTTP_200_OK, description="Retrieve the most voted posts over a time window",
+            summary="Top Posts Endpoint", response_description="Posts ranked by votes cast in the window")
+@query_budget(0)
+async def get_top_posts(window: Literal["1h", "24h", "7d"] = Query("24h", description="Time window of the ranking"),
+                        limit: int = Query(10, ge=1, description="Number of posts, at most RANKING_SIZE")):
+    """
+    Serve a page of the precomputed ranking, without touching the database.
+
+    ``votes`` is the number of votes cast in the window. The ranking is
+    refreshed every ``RANKING_REFRESH_SECONDS``, so it lags votes and post
+    edits by at most that long.
+    """
+    settings = get_settings()
+    if limit > settings.RANKING_SIZE:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"limit cannot be over {settings.RANKING_SIZE}")
+    return Response(ranking.get_top_posts().page(window, limit), media_type="application/json",
+                    headers={"Cache-Control": f"max-age={int(settings.RANKING_REFRESH_SECONDS)}"})
 
 #-------------------------------------------------------------------------------
 # Create Post Endpoint
 #-------------------------------------------------------------------------------
 @router.post("/createposts", response_model=schemas.PostResponse,
-             status_code=status.HTTP_201_CREATED, description="Create a new post", 
+             status_code=status.HTTP_201_CREATED, description="Create a new post",
+             dependencies=[Depends(ratelimit.limit_writes)],
              summary="Create Post Endpoint", response_description="The created post")
-def create_post(payload: schemas.PostCreate = Body(...), db:Session = Depends(get_db),
-                current_user_id: str = Depends(oauth2.get_current_user)):
-    """Create a new post in the database."""
-    new_post = models.Post(owner_id=current_user_id.user_id, **payload.dict())
+@query_budget(3)
+async def create_post(payload: schemas.PostCreate = Body(...), db: AsyncSession = Depends(get_db),
+                      current_user_id: str = Depends(oauth2.get_current_user)):
+    """Create a new post in the database, with its ``post_created`` job when one is handled."""
+    owner = await db.get(models.User, current_user_id.user_id)
+    if owner is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    new_post = models.Post(owner=owner, **payload.dict())
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
+    if jobs.listened(jobs.POST_CREATED):
+        # The job names the post, whose id comes from the INSERT
+        await db.flush()
+        jobs.enqueue(db, jobs.POST_CREATED, {"post_id": new_post.id, "owner_id": str(owner.id)})
+    await db.commit()
     return new_post
 
+#-------------------------------------------------------------------------------
+# Bulk Create Posts Endpoint
+#-------------------------------------------------------------------------------
+# Rows per INSERT statement; asyncpg binds at most 32767 parameters per statement
+BULK_INSERT_PAGE_SIZE = 2500
+
+
+def _bulk_budget() -> int:
+    # One INSERT per page of the largest accepted batch, plus the job enqueue
+    return -(-get_settings().POSTS_BULK_MAX_SIZE // BULK_INSERT_PAGE_SIZE) + 1
+
+
+@router.post("/bulk", response_model=schemas.PostBulkCreated, status_code=status.HTTP_201_CREATED,
+             description="Create up to POSTS_BULK_MAX_SIZE posts in one transaction",
+             dependencies=[Depends(ratelimit.limit_writes)],
+             summary="Bulk Create Posts Endpoint", response_description="The ids of the created posts, in request order")
+@query_budget(_bulk_budget)
+async def create_posts_bulk(posts: List[schemas.PostCreate] = Body(..., min_length=1),
+                            db: AsyncSession = Depends(get_db),
+                            current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    """
+    Create many posts owned by the current user, all or nothing.
+
+    Every item goes through the ``PostCreate`` validators, then the batch is
+    written by multi-row ``INSERT ... RETURNING`` statements (one per
+    ``BULK_INSERT_PAGE_SIZE`` rows) instead of a round trip per post. When
+    ``post_created`` is handled, one more statement of the transaction
+    enqueues a job per returned id.
+    """
+    max_size = get_settings().POSTS_BULK_MAX_SIZE
+    if len(posts) > max_size:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"At most {max_size} posts per request")
+    statement = insert(models.Post).returning(models.Post.id, sort_by_parameter_order=True).execution_options(
+        insertmanyvalues_page_size=BULK_INSERT_PAGE_SIZE)
+    try:
+        ids = list(await db.scalars(statement, [{**post.dict(), "owner_id": current_user.user_id} for post in posts]))
+    except IntegrityError as exc:
+        # The owner of a still valid token has been deleted
+        if getattr(exc.orig, "pgcode", None) != FOREIGN_KEY_VIOLATION:
+            raise
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    job = jobs.enqueue_from(jobs.POST_CREATED, select(
+        func.jsonb_build_object("post_id", models.Post.id, "owner_id", models.Post.owner_id)
+    ).where(models.Post.id.in_(ids)))
+    if job is not None:
+        await db.execute(job)
+        jobs.wake_on_commit(db)
+    await db.commit()
+    return {"ids": ids}
+
 #-------------------------------------------------------------------------------
 # Get Post by ID Endpoint
 #-------------------------------------------------------------------------------
-@router.get("/{id}",response_model = schemas.PostResponse, 
-            status_code=status.HTTP_200_OK, description="Retrieve a post by ID", 
+@router.get("/{id}",response_model = schemas.PostResponse,
+            status_code=status.HTTP_200_OK, description="Retrieve a post by ID",
             summary="Get Post by ID Endpoint", response_description="The requested post")
-def get_post(id: int, db:Session = Depends(get_db)):
-    """Retrieve a specific post by its ID from the database."""
-    post = db.query(models.Post).filter(models.Post.id == id).first()
-    if not post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} was not found")
-    return post
+@query_budget(1)
+async def get_post(id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Retrieve a specific post by its ID.
+
+    The serialized response is read through the response cache, and an
+    ``If-None-Match`` matching its ETag is answered with 304. The ETag names
+    the post's version, the one ``PUT`` expects in ``If-Match``.
+    """
+    key = cache.post_key(id)
+    entry = await cache.get_response_cache().get(key)
+    if entry is None:
+        post = await db.get(models.Post, id, options=POST_WITH_OWNER)
+        if not post:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} was not found")
+        version = post.version
+        body = schemas.PostResponse.model_validate(post, from_attributes=True).model_dump_json().encode()
+        await cache.cache_body(key, cache.with_version(version, body))
+    else:
+        version, body = cache.split_version(entry)
+    return cache.json_response(body, request, etag=cache.version_etag(version))
 
 
 #-------------------------------------------------------------------------------
 # Delete Post Endpoint
 #-------------------------------------------------------------------------------
-@router.delete("/{id}",response_model= None, 
+@router.delete("/{id}",response_model= None,
                status_code=status.HTTP_204_NO_CONTENT, description="Delete a post by ID",
+               dependencies=[Depends(ratelimit.limit_writes)],
                summary="Delete Post Endpoint", response_description="No content")
-def delete_post(id: int, db:Session = Depends(get_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+@query_budget(2)
+async def delete_post(id: int, db: AsyncSession = Depends(get_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
     """Delete a specific post by its ID from the database."""
-    deleted_post = db.query(models.Post).filter(models.Post.id == id)
-    post = deleted_post.first()
+    post = await db.get(models.Post, id)
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} does not exist")
 
     if post.owner_id != current_user.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
-    
-    deleted_post.delete(synchronize_session=False)
-    db.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT, 
-                    content=f"Post with id: {id} has been deleted successfully", 
+
+    statement = delete(models.Post).where(models.Post.id == id)
+    job = jobs.enqueue_from(jobs.POST_DELETED, select(func.jsonb_build_object("post_id", id)))
+    if job is not None:
+        statement = statement.add_cte(job.cte("job"))
+        jobs.wake_on_commit(db)
+    await db.execute(statement)
+    await db.commit()
+    await invalidate_cached_post(id, retried=job is not None)
+    return Response(status_code=status.HTTP_204_NO_CONTENT,
+                    content=f"Post with id: {id} has been deleted successfully",
                     media_type="application/json", headers={"X-Deleted-Post-ID": str(id)})
 
 #-------------------------------------------------------------------------------
 # Update Post Endpoint
 #-------------------------------------------------------------------------------
-@router.put("/{id}", response_model= schemas.PostResponse, 
-            status_code=status.HTTP_200_OK, description="Update a post by ID", 
-            summary="Update Post Endpoint", response_description="The updated post")
-def update_post_in_db(id: int, payload: schemas.PostUpdate = Body(...), db: Session = Depends(get_db)):
-    """Update a specific post by its ID in the database."""
-    post_query = db.query(models.Post).filter(models.Post.id == id)
-    post = post_query.first()
-    if post is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} does not exist")
-    post_query.update(payload.dict(), synchronize_session=False)
-    db.commit()
-    return post_query.first()
\ No newline at end of file
+@router.put("/{id}", response_model= schemas.PostResponse,
+            status_code=status.HTTP_200_OK, description="Update the given fields of a post by ID",
+            dependencies=[Depends(ratelimit.limit_writes)],
+            summary="Update Post Endpoint", response_description="The updated post",
+            responses={412: {"description": "The post changed since the version named in If-Match"}})
+@query_budget(2)
+async def update_post_in_db(id: int, request: Request, payload: schemas.PostUpdate = Body(...),
+                            db: AsyncSession = Depends(get_db),
+                            current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    """
+    Update the fields present in the body of a post owned by the current user.
+
+    With ``If-Match`` set to the post's ETag, the update only applies if
+    nobody changed the post since, and 412 is answered otherwise. The field
+    changes, the ownership and version checks, the version bump and, with a
+    shared cache, the ``post_updated`` job are one statement in autocommit, an
+    ``UPDATE ... RETURNING`` CTE joined to the owner; the post is only read
+    again when it matched nothing, to tell 404, 403 and 412 apart.
+    """
+    changes = payload.dict(exclude_unset=True)
+    # An empty change would still bump the version and fail other clients' If-Match
+    if not changes:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No field to update")
+    nulls = [name for name in ("title", "content", "published") if name in changes and changes[name] is None]
+    if nulls:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"{', '.join(nulls)} cannot be null")
+
+    conditions = [models.Post.id == id, models.Post.owner_id == current_user.user_id]
+    if_match = request.headers.get("if-match", "").strip()
+    if if_match and if_match != "*":
+        versions = [version for version in map(cache.parse_version_etag, if_match.split(",")) if version is not None]
+        conditions.append(models.Post.version.in_(versions))
+
+    await db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+    # Every column but the deferred search vector, which the response leaves out
+    returned = [column for column in models.Post.__table__.c if column.key != "search_vector"]
+    updated = update(models.Post).where(*conditions).values(
+        **changes, version=models.Post.version + 1).returning(*returned).cte("updated_post")
+    updated_post = aliased(models.Post, updated)
+    statement = select(updated_post, models.User).join(models.User, models.User.id == updated_post.owner_id)
+    job = jobs.enqueue_from(jobs.POST_UPDATED, select(func.jsonb_build_object("post_id", updated.c.id)))
+    if job is not None:
+        statement = statement.add_cte(job.cte("job"))
+    row = (await db.execute(statement)).first()
+    if row is None:
+        current = (await db.execute(select(models.Post.owner_id, models.Post.version).where(models.Post.id == id))).first()
+        if current is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {id} does not exist")
+        if current.owner_id != current_user.user_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to perform requested action")
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
+                            detail=f"Post with id: {id} was modified, its current version is {current.version}",
+                            headers={"ETag": cache.version_etag(current.version)})
+
+    post, owner = row
+    set_committed_value(post, "owner", owner)
+    await invalidate_cached_post(id, retried=job is not None)
+    if job is not None:
+        jobs.get_job_worker().wake()
+    body = schemas.PostResponse.model_validate(post, from_attributes=True).model_dump_json().encode()
+    return Response(content=body, media_type="application/json", headers={"ETag": cache.version_etag(post.version)})
@@ -1,8 +1,10 @@
-from fastapi import FastAPI, HTTPException, Response, status, Depends, APIRouter
+from fastapi import FastAPI, HTTPException, Request, Response, status, Depends, APIRouter
 from fastapi.params import Body
-from sqlalchemy.orm import Session
-from .. import models, schemas, utils
+from uuid import UUID, uuid4
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, hashing, cache, jobs, ratelimit
 from ..database import get_db
+from ..querycount import query_budget
 
 router = APIRouter(prefix="/user", tags=["Users"])
 
@@ -12,13 +14,17 @@ router = APIRouter(prefix="/user", tags=["Users"])
 #-------------------------------------------------------------------------------
 @router.post("/register", response_model=schemas.UserResponse, 
              status_code=status.HTTP_201_CREATED, description="Register a new user",
+             dependencies=[Depends(ratelimit.limit_registration)],
              summary="User Registration Endpoint", response_description="The created user")
-def create_user(user: schemas.UserCreate = Body(...), db: Session = Depends(get_db)):
-    user.password = utils.hash_password(user.password)
-    new_user = models.User(**user.dict())
+@query_budget(3)
+async def create_user(user: schemas.UserCreate = Body(...), db: AsyncSession = Depends(get_db)):
+    user.password = await hashing.hash_password(user.password)
+    # The id is drawn here rather than at flush so the job can name the user
+    new_user = models.User(id=uuid4(), **user.dict())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    jobs.enqueue(db, jobs.USER_REGISTERED, {"user_id": str(new_user.id)})
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 #-------------------------------------------------------------------------------
@@ -27,8 +33,14 @@ def create_user(user: schemas.UserCreate = Body(...), db: Session = Depends(get_
 @router.get("/users/{id}", response_model=schemas.UserResponse,
             status_code=status.HTTP_200_OK, description="Retrieve a user by ID",
             summary="Get User by ID Endpoint", response_description="The requested user")
-def get_user(id: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == id).first()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id: {id} was not found")
-    return user
\ No newline at end of file
+@query_budget(1)
+async def get_user(id: UUID, request: Request, db: AsyncSession = Depends(get_db)):
+    key = cache.user_key(id)
+    body = await cache.get_response_cache().get(key)
+    if body is None:
+        user = await db.get(models.User, id)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id: {id} was not found")
+        body = schemas.UserResponse.model_validate(user).model_dump_json().encode()
+        await cache.cache_body(key, body)
+    return cache.json_response(body, request)
\ No newline at end of file
@@ -1,36 +1,126 @@
+from typing import List
+
 from fastapi import FastAPI, HTTPException, Response, status, Depends, APIRouter
-from sqlalchemy.orm import Session
+from fastapi.params import Body
+from sqlalchemy import delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import models, schemas, oauth2
+from .. import jobs, models, schemas, oauth2, ratelimit, votes
+from ..config import get_settings
 from ..database import get_db
+from ..querycount import query_budget
 
 router = APIRouter(prefix="/vote", tags=["Votes"])
 
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+async def _apply_single_vote(db: AsyncSession, vote: schemas.Vote, user_id) -> str:
+    """
+    Apply one vote as a single statement and return its outcome.
+
+    The vote insert (``ON CONFLICT DO NOTHING``) or delete runs in a CTE whose
+    ``RETURNING`` row drives the ``post.votes_count`` update and the upsert of
+    its hour in ``post_vote_buckets``, and the ``vote_changed`` job when one is
+    handled. A statement is atomic on its own, so it runs in autocommit and
+    costs one round trip.
+    """
+    await db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+
+    if vote.dir == 1:
+        changed = insert(models.Vote).values(post_id=vote.post_id, user_id=user_id).on_conflict_do_nothing(
+        ).returning(models.Vote.post_id, models.Vote.created_at).cte("inserted_vote")
+        counter_step = 1
+    else:
+        changed = delete(models.Vote).where(
+            models.Vote.post_id == vote.post_id, models.Vote.user_id == user_id
+        ).returning(models.Vote.post_id, models.Vote.created_at).cte("deleted_vote")
+        counter_step = -1
+
+    bucket = insert(models.PostVoteBucket).from_select(
+        ["post_id", "bucket_start", "votes"],
+        select(changed.c.post_id, votes.vote_bucket(changed.c.created_at), literal(counter_step)))
+    bucket = bucket.on_conflict_do_update(
+        index_elements=[models.PostVoteBucket.post_id, models.PostVoteBucket.bucket_start],
+        set_={"votes": models.PostVoteBucket.votes + bucket.excluded.votes},
+    ).returning(models.PostVoteBucket.post_id).cte("bucket")
+
+    statement = update(models.Post).where(models.Post.id == changed.c.post_id).values(
+        votes_count=models.Post.votes_count + counter_step).returning(models.Post.id).add_cte(bucket)
+    job = jobs.enqueue_from(jobs.VOTE_CHANGED, select(
+        func.jsonb_build_object("post_id", changed.c.post_id, "user_id", str(user_id), "dir", vote.dir)))
+    if job is not None:
+        statement = statement.add_cte(job.cte("job"))
+    try:
+        result = await db.execute(statement, execution_options={"synchronize_session": False})
+    except IntegrityError as exc:
+        if getattr(exc.orig, "pgcode", None) != FOREIGN_KEY_VIOLATION:
+            raise
+        return votes.NOT_FOUND
+    if result.first() is None:
+        return votes.UNCHANGED
+    if job is not None:
+        jobs.get_job_worker().wake()
+    return votes.ADDED if vote.dir == 1 else votes.REMOVED
+
 #-------------------------------------------------------------------------------
 # Vote Endpoint
 #-------------------------------------------------------------------------------
 @router.post("/", status_code=status.HTTP_201_CREATED, description="Cast or remove a vote on a post",
-             summary="Vote Endpoint", response_description="Vote action result")
-def vote(vote: schemas.Vote, db: Session = Depends(get_db), current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
-    """ Cast or remove a vote on a post."""
+             summary="Vote Endpoint", response_description="Vote action result",
+             dependencies=[Depends(ratelimit.limit_writes)])
+@query_budget(1)
+async def vote(vote: schemas.Vote, response: Response, db: AsyncSession = Depends(get_db),
+               current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    """
+    Cast or remove a vote on a post.
+
+    Concurrent duplicate clicks can neither fail on the primary key nor move
+    the counter twice; voting again on an already voted post is a no-op
+    answered with 200. When ``VOTE_BUFFER_WINDOW_MS`` is set, the vote is
+    grouped with the others arriving in the same window into one statement.
+    """
+    vote_buffer = votes.get_vote_buffer()
+    if vote_buffer is not None:
+        outcome = await vote_buffer.submit(current_user.user_id, vote.post_id, vote.dir)
+    else:
+        outcome = await _apply_single_vote(db, vote, current_user.user_id)
 
-    post = db.query(models.Post).filter(models.Post.id == vote.post_id).first()
-    if not post:
+    if outcome == votes.NOT_FOUND:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with id: {vote.post_id} does not exist")
-    
-    vote_query = db.query(models.Vote).filter(models.Vote.post_id == vote.post_id, models.Vote.user_id == current_user.user_id)
-    found_vote = vote_query.first()
     if vote.dir == 1:
-        if found_vote:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"user {current_user.user_id} has already voted on post {vote.post_id}")
-        new_vote = models.Vote(post_id = vote.post_id, user_id = current_user.user_id)
-
-        db.add(new_vote)
-        db.commit()
+        if outcome == votes.UNCHANGED:
+            response.status_code = status.HTTP_200_OK
+            return {"message": "Vote already recorded"}
         return {"message": "Vote added successfully"}
     else:
-        if not found_vote:
+        if outcome == votes.UNCHANGED:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vote does not exist")
-        vote_query.delete(synchronize_session=False)
-        db.commit()
-        return {"message": "Vote removed successfully"}
\ No newline at end of file
+        return {"message": "Vote removed successfully"}
+
+#-------------------------------------------------------------------------------
+# Batch Vote Endpoint
+#-------------------------------------------------------------------------------
+@router.post("/batch", response_model=List[schemas.VoteResult], status_code=status.HTTP_200_OK,
+             description="Cast or remove up to VOTE_BATCH_MAX_SIZE votes in one transaction",
+             dependencies=[Depends(ratelimit.limit_writes)],
+             summary="Batch Vote Endpoint", response_description="The outcome of each vote, in request order")
+async def vote_batch(batch: List[schemas.Vote] = Body(..., min_length=1),
+                     db: AsyncSession = Depends(get_db),
+                     current_user: schemas.TokenData = Depends(oauth2.get_current_user)):
+    """
+    Apply a burst of votes with set-based SQL in a single transaction.
+
+    Items are applied as if one by one, in order, and each gets its own
+    status: ``added``, ``removed``, ``unchanged`` or ``not_found``.
+    """
+    max_size = get_settings().VOTE_BATCH_MAX_SIZE
+    if len(batch) > max_size:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"At most {max_size} votes per request")
+    outcomes = await votes.apply_votes(db, [(current_user.user_id, item.post_id, item.dir) for item in batch])
+    await db.commit()
+    return [schemas.VoteResult(post_id=item.post_id, dir=item.dir, status=outcome)
+            for item, outcome in zip(batch, outcomes)]
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from uuid import UUID
 from pydantic import BaseModel, Field, validator, EmailStr
 
@@ -15,6 +15,9 @@ class UserBase(BaseModel):
 # Modèle pour la réponse d'un utilisateur
 # --------------------------
 class UserResponse(UserBase):
+    # L'email stocké a déjà été validé à l'inscription : le revalider (idna) à
+    # chaque réponse coûtait l'essentiel de la sérialisation des posts
+    email: str = Field(..., description="Email address of the user", json_schema_extra={"format": "email"})
     id: UUID = Field(..., description="Unique identifier  of the user")
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp when the user was created")
 
@@ -76,6 +79,7 @@ class PostResponse(PostBase):
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp when the post was created")
     owner_id: UUID = Field(..., description="Identifier of the user who created the post")
     owner : UserResponse = Field(..., description="Details of the post owner")
+    version: int = Field(..., description="Version of the post, incremented by every update; sent back in If-Match to update it")
 
     class config:
         from_attributes = True
@@ -86,7 +90,8 @@ class PostResponse(PostBase):
                 "content": "This is the content of my first post.",
                 "published": True,
                 "rating": 5,
-                "created_at": "2024-01-01T12:00:00Z"
+                "created_at": "2024-01-01T12:00:00Z",
+                "version": 1
             }
         }
 
@@ -127,6 +132,19 @@ class PostUpdate(BaseModel):
             }
         }
 
+# --------------------------
+# Modèle pour la réponse d'une création de posts en lot
+# --------------------------
+class PostBulkCreated(BaseModel):
+    ids: List[int] = Field(..., description="Identifiers of the created posts, in request order")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "ids": [101, 102, 103]
+            }
+        }
+
 # --------------------------
 # Modèle pour la réponse d'un post avec le nombre de votes
 # --------------------------
@@ -189,14 +207,32 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str = Field(..., description="Access token for authentication")
     token_type: str = Field(..., description="Type of the token, e.g., Bearer")
+    expires_in: int = Field(..., description="Lifetime of the access token in seconds")
+    refresh_token: str = Field(..., description="Single-use token exchanged at /auth/refresh for a new access token")
 
     class Config:
         json_schema_extra = {
             "example": {
-                "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
-                "token_type": "bearer"
+                "access_token": "eyJhbGciOiJIUzI1NiIsImtpZCI6ImRlZmF1bHQiLCJ0eXAiOiJKV1QifQ...",
+                "token_type": "bearer",
+                "expires_in": 1800,
+                "refresh_token": "kq3Xv1nB0m8cS2yQ4JtW7pLz9dRf6hGa5eUoYiTsNxM"
             }
         }
+
+# --------------------------
+# Modèle pour le renouvellement ou la révocation d'un token
+# --------------------------
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1, max_length=256, description="Refresh token returned by /auth/login or /auth/refresh")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "refresh_token": "kq3Xv1nB0m8cS2yQ4JtW7pLz9dRf6hGa5eUoYiTsNxM"
+            }
+        }
+
 # --------------------------
 # Modèle pour les données du token
 # --------------------------
@@ -222,4 +258,21 @@ class Vote(BaseModel):
                 "post_id": 1,
                 "dir": 1
             }
-        }
\ No newline at end of file
+        }
+
+# --------------------------
+# Modèle pour le résultat d'un vote d'un lot
+# --------------------------
+class VoteResult(BaseModel):
+    post_id: int = Field(..., description="Identifier of the post voted on")
+    dir: int = Field(..., description="Direction of the vote that was requested")
+    status: Literal["added", "removed", "unchanged", "not_found"] = Field(..., description="What the vote changed")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "post_id": 1,
+                "dir": 1,
+                "status": "added"
+            }
+        }
@@ -1,9 +1,19 @@
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Optional, Tuple
 
-pw_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@lru_cache
+def get_pw_context():
+    """The passlib context, built on first use: passlib and its bcrypt backend are slow to import."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__min_rounds=12)
 
 def hash_password(password: str) -> str:
-    return pw_context.hash(password)
+    return get_pw_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pw_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return get_pw_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a fresh hash when ``needs_update`` flags the stored one."""
+    return get_pw_context().verify_and_update(plain_password, hashed_password)
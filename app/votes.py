@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+from uuid import UUID as PyUUID
+
+from sqlalchemy import Integer, case, column, delete, exists, func, literal, select, union_all, update, values
+from sqlalchemy.dialects.postgresql import UUID, insert
+
+from . import jobs, models
+from .config import get_settings
+from .database import session_scope
+
+#-------------------------------------------------------------------------------
+# Set-based vote application
+#-------------------------------------------------------------------------------
+# A vote item is (user_id, post_id, dir) and resolves to one of these outcomes
+ADDED = "added"
+REMOVED = "removed"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
+
+VoteItem = Tuple[PyUUID, int, int]
+
+
+def _rounds(items: Sequence[VoteItem]) -> List[List[Tuple[int, VoteItem]]]:
+    """
+    Split items into rounds in which every (user_id, post_id) appears once.
+
+    A single statement cannot see its own writes, so repeated votes on the
+    same pair go to later rounds. That keeps the outcome identical to applying
+    the items one by one, in order.
+    """
+    rounds: List[List[Tuple[int, VoteItem]]] = []
+    seen_count = {}
+    for position, item in enumerate(items):
+        key = (item[0], item[1])
+        depth = seen_count.get(key, 0)
+        seen_count[key] = depth + 1
+        if depth == len(rounds):
+            rounds.append([])
+        rounds[depth].append((position, item))
+    return rounds
+
+
+def vote_bucket(created_at):
+    """SQL expression of the ``post_vote_buckets`` hour of a vote timestamp, independent of the session time zone."""
+    return func.date_trunc("hour", created_at, "UTC")
+
+
+def _round_statement(round_items: List[Tuple[int, VoteItem]]):
+    vote_table = models.Vote.__table__
+    post_table = models.Post.__table__
+    bucket_table = models.PostVoteBucket.__table__
+
+    batch = select(
+        values(column("ord", Integer), column("user_id", UUID(as_uuid=True)), column("post_id", Integer),
+               column("dir", Integer), name="batch_values").data(
+            [(position, user_id, post_id, direction) for position, (user_id, post_id, direction) in round_items])
+    ).cte("batch")
+
+    inserted = insert(vote_table).from_select(
+        ["user_id", "post_id"],
+        select(batch.c.user_id, batch.c.post_id).join(post_table, post_table.c.id == batch.c.post_id).where(batch.c.dir == 1),
+    ).on_conflict_do_nothing().returning(vote_table.c.user_id, vote_table.c.post_id, vote_table.c.created_at).cte("inserted")
+
+    deleted = delete(vote_table).where(
+        vote_table.c.user_id == batch.c.user_id, vote_table.c.post_id == batch.c.post_id, batch.c.dir == 0,
+    ).returning(vote_table.c.user_id, vote_table.c.post_id, vote_table.c.created_at).cte("deleted")
+
+    changes = union_all(
+        select(inserted.c.user_id, inserted.c.post_id, inserted.c.created_at, literal(1, Integer).label("step")),
+        select(deleted.c.user_id, deleted.c.post_id, deleted.c.created_at, literal(-1, Integer).label("step")),
+    ).cte("changes")
+
+    deltas = select(changes.c.post_id, func.sum(changes.c.step).label("step")).group_by(changes.c.post_id).cte("deltas")
+
+    updated = update(post_table).where(post_table.c.id == deltas.c.post_id).values(
+        votes_count=post_table.c.votes_count + deltas.c.step).returning(post_table.c.id).cte("updated")
+
+    # A removed vote is taken back from the hour it was cast in
+    bucket = vote_bucket(changes.c.created_at)
+    bucket_deltas = select(changes.c.post_id, bucket.label("bucket_start"), func.sum(changes.c.step).label("votes")
+                           ).group_by(changes.c.post_id, bucket)
+    rolled_up = insert(bucket_table).from_select(["post_id", "bucket_start", "votes"], bucket_deltas)
+    rolled_up = rolled_up.on_conflict_do_update(
+        index_elements=[bucket_table.c.post_id, bucket_table.c.bucket_start],
+        set_={"votes": bucket_table.c.votes + rolled_up.excluded.votes},
+    ).returning(bucket_table.c.post_id).cte("rolled_up")
+
+    statement = select(
+        batch.c.ord,
+        exists().where(changes.c.user_id == batch.c.user_id, changes.c.post_id == batch.c.post_id).label("changed"),
+        exists().where(post_table.c.id == batch.c.post_id).label("post_exists"),
+    ).add_cte(updated, rolled_up)
+
+    job = jobs.enqueue_from(jobs.VOTE_CHANGED, select(func.jsonb_build_object(
+        "post_id", changes.c.post_id, "user_id", changes.c.user_id, "dir", case((changes.c.step == 1, 1), else_=0))))
+    if job is not None:
+        statement = statement.add_cte(job.cte("jobs"))
+    return statement
+
+
+async def apply_votes(db, items: Sequence[VoteItem]) -> List[str]:
+    """
+    Apply vote items with set-based SQL and return one outcome per item.
+
+    Each round is a single statement: the inserts and deletes run in CTEs and
+    their ``RETURNING`` rows are summed into one ``post.votes_count`` update
+    per post and one ``post_vote_buckets`` upsert per post and hour, plus a
+    ``vote_changed`` job per applied vote when one is handled. The caller
+    owns the transaction and commits it.
+    """
+    if jobs.listened(jobs.VOTE_CHANGED):
+        jobs.wake_on_commit(db)
+    outcomes: List[Optional[str]] = [None] * len(items)
+    for round_items in _rounds(items):
+        for row in (await db.execute(_round_statement(round_items))).all():
+            direction = items[row.ord][2]
+            if row.changed:
+                outcomes[row.ord] = ADDED if direction == 1 else REMOVED
+            else:
+                outcomes[row.ord] = UNCHANGED if row.post_exists else NOT_FOUND
+    return outcomes
+
+#-------------------------------------------------------------------------------
+# Grouped flushing of single votes
+#-------------------------------------------------------------------------------
+class VoteBuffer:
+    """
+    Collect single votes for a short window and flush them as one batch.
+
+    Callers await the outcome of their own item, so the HTTP answer stays
+    exact while many concurrent votes share one transaction. Flushes are
+    serialized to keep votes on the same pair in arrival order.
+    """
+
+    def __init__(self, window_ms: int, max_items: int):
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._pending: List[Tuple[VoteItem, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._tasks = set()
+
+    async def submit(self, user_id: PyUUID, post_id: int, direction: int) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((user_id, post_id, direction), future))
+        if len(self._pending) >= self.max_items:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            # Run detached from the context of the request that triggered the flush
+            task = contextvars.Context().run(asyncio.ensure_future, self._flush(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, pending):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            try:
+                async with session_scope() as db:
+                    outcomes = await apply_votes(db, [item for item, _ in pending])
+                    await db.commit()
+            except Exception as exc:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+        for (_, future), outcome in zip(pending, outcomes):
+            if not future.done():
+                future.set_result(outcome)
+
+    async def close(self):
+        """Flush whatever is still waiting, e.g. on shutdown."""
+        self._start_flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+@lru_cache
+def get_vote_buffer() -> Optional[VoteBuffer]:
+    """The vote buffer, or None when VOTE_BUFFER_WINDOW_MS disables grouping."""
+    settings = get_settings()
+    return VoteBuffer(settings.VOTE_BUFFER_WINDOW_MS, settings.VOTE_BATCH_MAX_SIZE) if settings.VOTE_BUFFER_WINDOW_MS else None
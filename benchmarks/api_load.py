@@ -0,0 +1,192 @@
+"""
+Load test of the API's hot paths.
+
+Seeds the configured PostgreSQL with --users users, --posts posts and --votes
+votes, then runs each scenario with --concurrency clients sharing its request
+count, through httpx.AsyncClient against the ASGI app:
+
+* login: POST /auth/login with seeded users (bcrypt bound)
+* list: GET /posts/ first pages
+* get: GET /posts/{id} on random seeded posts
+* vote: POST /vote/ up or down on random seeded posts
+
+Reports p50/p95/p99 latency, req/s and status codes per scenario. --save
+writes the results to a baseline JSON file; --baseline compares the run with
+one and exits with status 1 when a scenario's p95 grew, or its req/s fell,
+by more than --tolerance. The app relies on PostgreSQL-only SQL, so there is
+no SQLite stand-in. Run it from the repository root::
+
+    python -m benchmarks.api_load --save benchmarks/baseline.json
+    python -m benchmarks.api_load --baseline benchmarks/baseline.json --scenarios list get
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import insert
+
+# Every request comes from one client address and the login scenario reuses a few
+# emails, so the rate limits would soon answer 429 instead of measuring the API
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+# The seed needs the tables, also on a database Alembic has not set up
+os.environ.setdefault("DATABASE_CREATE_TABLES", "true")
+
+from app import database, models, oauth2, utils
+from app.config import get_settings
+from app.main import app
+from app.reconcile import reconcile_vote_buckets, reconcile_votes_count
+
+from .vote_load import percentile
+
+PASSWORD = "load-test-password"
+SCENARIOS = ("login", "list", "get", "vote")
+
+
+async def seed(rng: random.Random, users: int, posts: int, votes: int):
+    """Insert the data set in bulk and return the user ids and post ids."""
+    tag = uuid.uuid4().hex[:8]
+    # One bcrypt hash shared by every user keeps seeding fast
+    hashed = utils.hash_password(PASSWORD)
+    user_rows = [{"id": uuid.uuid4(), "email": f"load-{tag}-{i}@example.com", "password": hashed}
+                 for i in range(users)]
+    user_ids = [row["id"] for row in user_rows]
+
+    async with database.session_scope() as db:
+        await db.execute(insert(models.User), user_rows)
+        post_ids = list(await db.scalars(insert(models.Post).returning(models.Post.id), [
+            {"title": f"Load test post {i}", "content": "Lorem ipsum dolor sit amet. " * 8,
+             "owner_id": rng.choice(user_ids)}
+            for i in range(posts)]))
+        pairs = set()
+        while len(pairs) < min(votes, users * posts):
+            pairs.add((rng.choice(user_ids), rng.choice(post_ids)))
+        if pairs:
+            await db.execute(insert(models.Vote), [{"user_id": u, "post_id": p} for u, p in pairs])
+        await db.run_sync(lambda session: reconcile_votes_count(session.connection()))
+        await db.run_sync(lambda session: reconcile_vote_buckets(session.connection()))
+        await db.commit()
+    return [row["email"] for row in user_rows], user_ids, post_ids
+
+
+async def run_scenario(client: httpx.AsyncClient, total: int, concurrency: int, request) -> dict:
+    """Send ``total`` requests from ``concurrency`` clients and summarize them."""
+    latencies, statuses = [], Counter()
+    remaining = iter(range(total))
+
+    async def worker():
+        for i in remaining:
+            start = time.perf_counter()
+            response = await request(i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    results = {}
+    async with app.router.lifespan_context(app):
+        emails, user_ids, post_ids = await seed(rng, args.users, args.posts, args.votes)
+        # Tokens are minted directly so that only the login scenario pays for bcrypt
+        auth = [{"Authorization": f"Bearer {oauth2.create_access_token(data={'sub': str(user_id)})}"}
+                for user_id in user_ids]
+
+        requests = {
+            "login": lambda i: client.post("/auth/login", data={"username": rng.choice(emails), "password": PASSWORD}),
+            "list": lambda i: client.get("/posts/", params={"limit": 20}),
+            "get": lambda i: client.get(f"/posts/{rng.choice(post_ids)}"),
+            "vote": lambda i: client.post("/vote/", json={"post_id": rng.choice(post_ids), "dir": rng.randint(0, 1)},
+                                          headers=rng.choice(auth)),
+        }
+
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name in args.scenarios:
+                total = args.login_requests if name == "login" else args.requests
+                await run_scenario(client, min(args.warmup, total), args.concurrency, requests[name])
+                results[name] = await run_scenario(client, total, args.concurrency, requests[name])
+                print_result(name, results[name])
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"users": args.users, "posts": args.posts, "votes": args.votes, "concurrency": args.concurrency,
+                   "database_mode": get_settings().DATABASE_MODE},
+        "scenarios": results,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(f"{name:<6} {result['requests']:>6} req  {result['rps']:>8.1f} req/s  p50={result['p50_ms']:.1f}ms "
+          f"p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms  {result['statuses']}")
+
+
+def regressions(report: dict, baseline: dict, tolerance: float):
+    """Yield a message for each scenario slower than the baseline beyond the tolerance."""
+    if report["config"] != baseline.get("config"):
+        print(f"warning: baseline config {baseline.get('config')} differs from {report['config']}")
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            yield f"{name}: p95 {before['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms"
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            yield f"{name}: throughput {before['rps']:.1f} -> {result['rps']:.1f} req/s"
+        errors = sum(count for code, count in result["statuses"].items() if code.startswith("5"))
+        if errors:
+            yield f"{name}: {errors} server error(s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="requests of the login scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline JSON file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare the results with this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default 0.15)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = list(regressions(report, json.load(f), args.tolerance))
+        for message in found:
+            print(f"REGRESSION {message}")
+        if found:
+            sys.exit(1)
+        print("no regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
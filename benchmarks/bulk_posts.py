@@ -0,0 +1,64 @@
+"""
+Throughput of POST /posts/bulk against looping POST /posts/createposts.
+
+Creates --posts posts for one user, first one request per post (--concurrency
+at a time), then in /posts/bulk batches of each --batch size, and reports
+rows/s for each. Needs the database configured in ``.env``; run it from the
+repository root::
+
+    python -m benchmarks.bulk_posts --posts 5000 --batch 100 1000 5000
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+# One user posting batches back to back would soon hit the write rate limit
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+# Runnable against a fresh database
+os.environ.setdefault("DATABASE_CREATE_TABLES", "true")
+
+from app.main import app
+
+
+async def run(posts: int, concurrency: int, batches):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            email = f"bulk-{uuid.uuid4().hex[:12]}@example.com"
+            await client.post("/user/register", json={"email": email, "password": "benchpass"})
+            login = await client.post("/auth/login", data={"username": email, "password": "benchpass"})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            items = [{"title": f"Imported post {i}", "content": "Lorem ipsum dolor sit amet. " * 8} for i in range(posts)]
+
+            remaining = iter(items)
+
+            async def worker():
+                for item in remaining:
+                    response = await client.post("/posts/createposts", json=item, headers=headers)
+                    assert response.status_code == 201, response.text
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            print(f"{'/posts/createposts':<24} {posts} rows in {elapsed:6.2f}s  {posts / elapsed:9.0f} rows/s")
+
+            for batch in batches:
+                started = time.perf_counter()
+                for start in range(0, posts, batch):
+                    response = await client.post("/posts/bulk", json=items[start:start + batch], headers=headers)
+                    assert response.status_code == 201, response.text
+                elapsed = time.perf_counter() - started
+                print(f"{f'/posts/bulk batch={batch}':<24} {posts} rows in {elapsed:6.2f}s  {posts / elapsed:9.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent /posts/createposts requests")
+    parser.add_argument("--batch", type=int, nargs="+", default=[100, 1000, 5000], help="/posts/bulk batch sizes")
+    args = parser.parse_args()
+    asyncio.run(run(args.posts, args.concurrency, args.batch))
@@ -0,0 +1,189 @@
+"""
+Query plan regression check of the SQL the routers issue.
+
+Seeds the configured PostgreSQL like ``api_load`` (--users, --posts, --votes),
+runs ANALYZE, then sends one request of every API scenario through the ASGI
+app while recording the statements it executes. Each recorded statement, plus
+the lookups run by the foreign key cascades, is planned with
+``EXPLAIN (FORMAT JSON)``; the check exits with status 1 when a plan reads one
+of the seeded tables with a sequential scan, unless the scenario is allowed
+to (ALLOWED_SEQ_SCANS). Run it from the repository root::
+
+    python -m benchmarks.explain_plans
+    python -m benchmarks.explain_plans --posts 100000 --votes 500000 --verbose
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import uuid
+
+import httpx
+
+# Plans do not depend on the driver; the sync engine lets the recorded
+# statements be replayed as they were sent. Rate limits would reject the run,
+# and the seed needs the tables even when Alembic has not created them.
+os.environ.setdefault("DATABASE_MODE", "sync")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+os.environ.setdefault("DATABASE_CREATE_TABLES", "true")
+# The ranking is refreshed once, as a scenario, rather than in the background
+os.environ.setdefault("RANKING_REFRESH_SECONDS", "3600")
+
+from sqlalchemy import event, text
+
+from app import database, oauth2, ranking
+from app.main import app
+
+from .api_load import PASSWORD, seed
+
+# Tables the seed fills; scanning one of them whole is what this check catches
+SEEDED_TABLES = {"users", "post", "votes", "post_vote_buckets"}
+
+# (scenario, table) pairs where reading the whole table is the point
+ALLOWED_SEQ_SCANS = {
+    ("export", "post"),
+    # The seeded votes all fall in the current hour, inside every ranking window
+    ("ranking refresh", "post_vote_buckets"),
+}
+
+# What ON DELETE CASCADE runs for every deleted row; these lookups never show up
+# in a plan of the DELETE itself
+CASCADE_LOOKUPS = {
+    "delete user: posts": "DELETE FROM post WHERE owner_id = %(id)s",
+    "delete user: votes": "DELETE FROM votes WHERE user_id = %(id)s",
+    "delete user: refresh tokens": "DELETE FROM refresh_tokens WHERE user_id = %(id)s",
+    "delete post: votes": "DELETE FROM votes WHERE post_id = %(post_id)s",
+    "delete post: vote buckets": "DELETE FROM post_vote_buckets WHERE post_id = %(post_id)s",
+}
+
+PLANNED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class StatementRecorder:
+    """Record the statements sent to the database, labelled with the current scenario."""
+
+    def __init__(self):
+        self.scenario = None
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.scenario is not None and statement.lstrip().upper().startswith(PLANNED):
+            # executemany passes a list of parameter sets, all planned alike; batched
+            # insertmanyvalues statements pass a single set
+            if isinstance(parameters, list):
+                parameters = parameters[0]
+            self.statements.append((self.scenario, statement, parameters))
+
+
+async def run_scenarios(client: httpx.AsyncClient, recorder: StatementRecorder, email: str, user_id, post_ids):
+    """Send one request of each scenario, as a seeded user."""
+    rng = random.Random(0)
+    headers = {"Authorization": f"Bearer {oauth2.create_access_token(data={'sub': str(user_id)})}"}
+    new_email = f"plan-{uuid.uuid4().hex[:8]}@example.com"
+
+    async def send(scenario, method, url, **kwargs):
+        recorder.scenario = scenario
+        response = await client.request(method, url, **kwargs)
+        if method == "GET" and url.startswith("/posts/export"):
+            await response.aread()
+        recorder.scenario = None
+        if response.status_code >= 400:
+            sys.exit(f"{scenario}: {method} {url} answered {response.status_code} {response.text}")
+        return response
+
+    await send("register", "POST", "/user/register", json={"email": new_email, "password": PASSWORD})
+    login = await send("login", "POST", "/auth/login", data={"username": email, "password": PASSWORD})
+    await send("refresh", "POST", "/auth/refresh", json={"refresh_token": login.json()["refresh_token"]})
+    await send("get user", "GET", f"/user/users/{user_id}")
+    first = await send("list", "GET", "/posts/", params={"limit": 20})
+    await send("list next page", "GET", "/posts/", params={"limit": 20, "cursor": first.headers["X-Next-Cursor"]})
+    # A selective search, as a term found in every post says nothing of the indexes
+    await send("search", "GET", "/posts/", params={"limit": 20, "search": f"post {rng.randrange(len(post_ids))}"})
+    await send("get post", "GET", f"/posts/{rng.choice(post_ids)}")
+    await send("export", "GET", "/posts/export", headers=headers)
+    created = await send("create post", "POST", "/posts/createposts", headers=headers,
+                         json={"title": "Plan check", "content": "Plan check"})
+    await send("bulk", "POST", "/posts/bulk", headers=headers,
+               json=[{"title": f"Plan check {i}", "content": "Plan check"} for i in range(10)])
+    post_id = created.json()["id"]
+    await send("update post", "PUT", f"/posts/{post_id}", headers=headers,
+               json={"title": "Plan check", "content": "Updated", "published": True})
+    await send("vote", "POST", "/vote/", headers=headers, json={"post_id": post_id, "dir": 1})
+    await send("vote batch", "POST", "/vote/batch", headers=headers,
+               json=[{"post_id": rng.choice(post_ids), "dir": 1}, {"post_id": post_id, "dir": 0}])
+    await send("delete post", "DELETE", f"/posts/{post_id}", headers=headers)
+    recorder.scenario = "ranking refresh"
+    await ranking.get_top_posts().refresh()
+    recorder.scenario = None
+    return {"id": str(user_id), "post_id": post_id}
+
+
+def seq_scans(plan: dict):
+    """Yield the relations read by a sequential scan anywhere in a plan tree."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+def explain(statements, verbose: bool):
+    """Plan every statement and return the failures."""
+    failures = []
+    connection = database.get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        for scenario, statement, parameters in statements:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0][0]["Plan"]
+            scanned = [table for table in seq_scans(plan)
+                       if table in SEEDED_TABLES and (scenario, table) not in ALLOWED_SEQ_SCANS]
+            status = "FAIL" if scanned else "ok"
+            print(f"{status:<4} {scenario:<28} cost={plan['Total Cost']:>12.1f}  {' '.join(statement.split())[:90]}")
+            if verbose:
+                print(json.dumps(plan, indent=2))
+            failures.extend(f"{scenario}: sequential scan of {table}" for table in scanned)
+        connection.rollback()
+    finally:
+        connection.close()
+    return failures
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    recorder = StatementRecorder()
+    async with app.router.lifespan_context(app):
+        emails, user_ids, post_ids = await seed(rng, args.users, args.posts, args.votes)
+        async with database.session_scope() as db:
+            await db.execute(text("ANALYZE"))
+            await db.commit()
+        event.listen(database.get_engine(), "before_cursor_execute", recorder)
+        try:
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://plans", timeout=None) as client:
+                cascade_parameters = await run_scenarios(client, recorder, emails[0], user_ids[0], post_ids)
+        finally:
+            event.remove(database.get_engine(), "before_cursor_execute", recorder)
+    statements = recorder.statements + [(scenario, statement, cascade_parameters)
+                                        for scenario, statement in CASCADE_LOOKUPS.items()]
+    return explain(statements, args.verbose)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--votes", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
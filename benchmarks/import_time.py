@@ -0,0 +1,86 @@
+"""
+Import-time budget check for worker boot.
+
+Imports ``app.main`` in fresh interpreters under ``-X importtime`` and fails
+(exit status 1) when:
+
+* a module that should load on first use (DB drivers, jose, passlib) was
+  imported at boot,
+* the settings were read at boot, which keeps tests from overriding them,
+* the best of --runs boot times exceeds --budget-ms, or
+* it is slower than the --baseline boot time by more than --tolerance.
+
+Prints the boot time and the modules with the largest self time. --save
+records the boot time as the baseline of later runs on the same machine.
+Run it from the repository root::
+
+    python -m benchmarks.import_time --save import_baseline.json
+    python -m benchmarks.import_time --baseline import_baseline.json --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Loaded by the first token, password or database use, never by importing the app
+DEFERRED_MODULES = ("jose", "passlib", "psycopg2", "asyncpg")
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Prints whether importing the app built the settings
+BOOT = "import app.main; from app.config import get_settings; print(get_settings.cache_info().currsize)"
+
+
+def measure():
+    """Return (self_us, cumulative_us, depth, module) for every import of one boot, and whether it read the settings."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", BOOT],
+                            capture_output=True, text=True, env=os.environ)
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+    rows = [(int(m[1]), int(m[2]), len(m[3]) // 2, m[4])
+            for m in map(LINE.match, result.stderr.splitlines()) if m]
+    return rows, result.stdout.strip() != "0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget-ms", type=float, help="maximum boot time of app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="modules with the largest self time to show")
+    parser.add_argument("--save", metavar="PATH", help="write the boot time as a baseline JSON file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare the boot time with this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    args = parser.parse_args()
+
+    runs, settings_read = zip(*(measure() for _ in range(args.runs)))
+    best = min(runs, key=lambda rows: next(cum for _, cum, _, name in rows if name == "app.main"))
+    boot_ms = next(cum for _, cum, _, name in best if name == "app.main") / 1000
+
+    print(f"app.main boot: {boot_ms:.1f} ms (best of {args.runs})")
+    for self_us, _, _, name in sorted(best, reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:7.1f} ms  {name}")
+
+    imported = {name.split(".")[0] for _, _, _, name in best}
+    failures = [f"{module} is imported at boot" for module in DEFERRED_MODULES if module in imported]
+    if any(settings_read):
+        failures.append("the settings are read at boot, not on first use")
+    if args.budget_ms is not None and boot_ms > args.budget_ms:
+        failures.append(f"boot time {boot_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    if args.baseline:
+        with open(args.baseline) as f:
+            before = json.load(f)["boot_ms"]
+        if boot_ms > before * (1 + args.tolerance):
+            failures.append(f"boot time {before:.1f} ms -> {boot_ms:.1f} ms")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"boot_ms": round(boot_ms, 1), "runs": args.runs}, f, indent=2)
+        print(f"baseline saved to {args.save}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+End-to-end check of the outbox job worker against PostgreSQL.
+
+Enqueues --jobs jobs that succeed, one that fails once and one that always
+fails, plus one claimed by a worker that then "dies" without settling it, and
+runs them with a pool of ``JobWorker`` tasks using a short lease. The check
+exits with status 1 unless every job ran as expected:
+
+* each succeeding job ran exactly once, despite concurrent claims;
+* the job of the dead worker ran again once its lease expired;
+* the flaky job was retried after its backoff, then deleted;
+* the broken job was given up after --max-attempts, keeping its last error.
+
+It also reports the throughput of the succeeding jobs. Jobs of other kinds in
+the table are left alone. Run it from the repository root::
+
+    python -m benchmarks.outbox_jobs
+    python -m benchmarks.outbox_jobs --jobs 5000 --workers 4
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+from sqlalchemy import delete, select
+
+from app import database, jobs, models
+
+CHECK_OK = "check_ok"
+CHECK_FLAKY = "check_flaky"
+CHECK_BROKEN = "check_broken"
+CHECK_KINDS = (CHECK_OK, CHECK_FLAKY, CHECK_BROKEN)
+
+runs = Counter()
+
+
+@jobs.handler(CHECK_OK)
+async def succeed(payload):
+    runs[payload["n"]] += 1
+
+
+@jobs.handler(CHECK_FLAKY)
+async def fail_once(payload):
+    runs[payload["n"]] += 1
+    if runs[payload["n"]] == 1:
+        raise RuntimeError("first attempt fails")
+
+
+@jobs.handler(CHECK_BROKEN)
+async def always_fail(payload):
+    runs[payload["n"]] += 1
+    raise RuntimeError("always fails")
+
+
+async def enqueue(*items):
+    async with database.session_scope() as db:
+        for kind, n in items:
+            jobs.enqueue(db, kind, {"n": n})
+        await db.commit()
+
+
+async def remaining():
+    """Jobs of the check still in the table, as (kind, n, attempts, failed, last_error)."""
+    async with database.session_scope() as db:
+        rows = (await db.execute(select(models.OutboxJob).where(models.OutboxJob.kind.in_(CHECK_KINDS)))).scalars()
+        return [(job.kind, job.payload["n"], job.attempts, job.failed_at is not None, job.last_error) for job in rows]
+
+
+async def cleanup():
+    async with database.session_scope() as db:
+        await db.execute(delete(models.OutboxJob).where(models.OutboxJob.kind.in_(CHECK_KINDS)))
+        await db.commit()
+
+
+async def run(args):
+    failures = []
+    # Runnable against a fresh database; a migrated schema is left alone
+    await database.create_all()
+    await cleanup()
+
+    # Enqueued first, so the worker that dies claims it alone
+    leased = -1
+    await enqueue((CHECK_OK, leased))
+    dead = jobs.JobWorker(concurrency=1, batch_size=1, poll_interval=1, lease=args.lease, max_attempts=args.max_attempts)
+    claimed = await dead._claim()
+    if [job.payload["n"] for job in claimed] != [leased]:
+        failures.append(f"the dead worker claimed {[job.payload for job in claimed]}, not the leased job")
+
+    flaky, broken = -2, -3
+    await enqueue((CHECK_FLAKY, flaky), (CHECK_BROKEN, broken))
+    await enqueue(*((CHECK_OK, n) for n in range(args.jobs)))
+
+    worker = jobs.JobWorker(concurrency=args.workers, batch_size=args.batch_size, poll_interval=0.1,
+                            lease=args.lease, max_attempts=args.max_attempts)
+    started = time.perf_counter()
+    worker.start()
+    try:
+        while sum(runs[n] for n in range(args.jobs)) < args.jobs and time.perf_counter() - started < args.timeout:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        print(f"{args.jobs} jobs in {elapsed:.2f}s, {args.jobs / elapsed:.0f} jobs/s with {args.workers} task(s)")
+
+        # Until only the broken job is left, given up; the backoff after attempt k is 2**k seconds
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline:
+            left = await remaining()
+            if len(left) == 1 and left[0][1] == broken and left[0][3]:
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        await worker.close()
+
+    twice = [n for n in range(args.jobs) if runs[n] != 1]
+    if twice:
+        failures.append(f"{len(twice)} succeeding job(s) did not run exactly once, e.g. {twice[:5]}")
+    if runs[leased] != 1:
+        failures.append(f"the job of the dead worker ran {runs[leased]} time(s), expected 1 after its lease")
+    if runs[flaky] != 2:
+        failures.append(f"the flaky job ran {runs[flaky]} time(s), expected 2")
+    if runs[broken] != args.max_attempts:
+        failures.append(f"the broken job ran {runs[broken]} time(s), expected {args.max_attempts}")
+
+    left = await remaining()
+    for kind, n, attempts, failed, last_error in left:
+        if n == broken and failed and attempts == args.max_attempts and "always fails" in (last_error or ""):
+            print(f"ok   broken job given up after {attempts} attempts: {last_error}")
+        else:
+            failures.append(f"job {kind} {n} left in the table: attempts={attempts} failed={failed} error={last_error}")
+    if not any(n == broken for _, n, *_ in left):
+        failures.append("the broken job was not kept as failed")
+    await cleanup()
+    await database.dispose()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--lease", type=float, default=1, help="seconds before a dead worker's job is claimed again")
+    parser.add_argument("--max-attempts", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Serialization microbenchmark for GET /posts/ pages.
+
+Builds in-memory posts with their owners (no database needed) and times
+turning a page of them into JSON bytes:
+
+* ``response_model``: what FastAPI does for a returned list of rows, i.e.
+  validate and dump to Python dicts, then encode with ``JSONResponse``;
+* the same, encoded with ``ORJSONResponse``;
+* the fast path of the endpoint: ``TypeAdapter.validate_python`` then
+  ``dump_json``, entirely in pydantic-core.
+
+Reports the best time per 1k posts. Run it from the repository root::
+
+    python -m benchmarks.serialization --posts 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+
+from app import models
+from app.main import app
+from app.router.poste import POST_PAGE
+
+
+def make_rows(count: int):
+    owner = models.User(id=uuid.uuid4(), email="bench@example.com", password="x",
+                        created_at=datetime.now(timezone.utc))
+    return [
+        SimpleNamespace(
+            Post=models.Post(id=i, title=f"Post number {i}", content="Lorem ipsum dolor sit amet. " * 8,
+                             published=True, rating=i % 6, created_at=datetime.now(timezone.utc),
+                             owner_id=owner.id, owner=owner, version=1),
+            votes=i % 50,
+        )
+        for i in range(count)
+    ]
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.posts)
+    field = next(route.response_field for route in app.routes
+                 if getattr(route, "path", None) == "/posts/" and "GET" in route.methods)
+    loop = asyncio.new_event_loop()
+
+    def through_response_model(response_class):
+        content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+        return response_class(content).body
+
+    candidates = {
+        "response_model + JSONResponse": lambda: through_response_model(JSONResponse),
+        "response_model + ORJSONResponse": lambda: through_response_model(ORJSONResponse),
+        "TypeAdapter.dump_json": lambda: POST_PAGE.dump_json(POST_PAGE.validate_python(rows, from_attributes=True)),
+    }
+    bodies = {name: fn() for name, fn in candidates.items()}
+    # All paths must produce the same document, whitespace aside
+    assert len({json.dumps(json.loads(body)) for body in bodies.values()}) == 1
+
+    print(f"{args.posts} posts, best of {args.repeat}")
+    for name, fn in candidates.items():
+        seconds = best_of(args.repeat, fn)
+        print(f"  {name:<34} {seconds * 1000 * 1000 / args.posts:8.2f} ms per 1k posts  "
+              f"({len(bodies[name])} bytes)")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Concurrent load test for POST /vote/.
+
+Registers a few users, creates some posts, then has every user fire bursts of
+duplicate up/down votes at them concurrently ("rapid clicks"). With --batch,
+each user sends its votes of a round through POST /vote/batch instead.
+Reports votes/s, latency percentiles, the status codes seen, and whether
+``post.votes_count`` still matches the ``votes`` table afterwards. Needs the
+database configured in ``.env``; run it from the repository root::
+
+    python -m benchmarks.vote_load --users 20 --rounds 10
+    python -m benchmarks.vote_load --users 20 --posts 50 --clicks 1 --batch
+    VOTE_BUFFER_WINDOW_MS=5 python -m benchmarks.vote_load --users 20 --posts 50 --clicks 1
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from collections import Counter
+
+import httpx
+from sqlalchemy import func, select
+
+# Voters all share one client address; the rate limiter is not what is measured
+os.environ.setdefault("RATE_LIMIT_BACKEND", "none")
+# Creates the tables it seeds when they are missing
+os.environ.setdefault("DATABASE_CREATE_TABLES", "true")
+
+from app import database, models
+from app.main import app
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+async def run(users: int, posts: int, rounds: int, clicks: int, batch: bool):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            headers = []
+            for _ in range(users):
+                email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+                await client.post("/user/register", json={"email": email, "password": "benchpass"})
+                login = await client.post("/auth/login", data={"username": email, "password": "benchpass"})
+                headers.append({"Authorization": f"Bearer {login.json()['access_token']}"})
+            post_ids = []
+            for _ in range(posts):
+                post = await client.post("/posts/createposts", json={"title": "vote load", "content": "x"}, headers=headers[0])
+                post_ids.append(post.json()["id"])
+
+            latencies, statuses = [], Counter()
+
+            async def send(h, url, body):
+                start = time.perf_counter()
+                response = await client.post(url, json=body, headers=h)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] += 1
+
+            started = time.perf_counter()
+            for direction in [1, 0] * rounds:
+                if batch:
+                    body = [{"post_id": post_id, "dir": direction} for post_id in post_ids for _ in range(clicks)]
+                    await asyncio.gather(*(send(h, "/vote/batch", body) for h in headers))
+                else:
+                    await asyncio.gather(*(send(h, "/vote/", {"post_id": post_id, "dir": direction})
+                                           for h in headers for post_id in post_ids for _ in range(clicks)))
+            elapsed = time.perf_counter() - started
+            total_votes = 2 * rounds * users * posts * clicks
+
+    async with app.router.lifespan_context(app):
+        db = database.get_db()
+        session = await db.__anext__()
+        stored = await session.scalar(select(func.sum(models.Post.votes_count)).where(models.Post.id.in_(post_ids)))
+        actual = await session.scalar(select(func.count()).select_from(models.Vote).where(models.Vote.post_id.in_(post_ids)))
+        await db.aclose()
+
+    print(f"requests   {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s, {total_votes / elapsed:.0f} votes/s)")
+    print(f"latency ms p50={statistics.median(latencies):.1f} p95={percentile(latencies, 95):.1f} "
+          f"p99={percentile(latencies, 99):.1f}")
+    print(f"statuses   {dict(sorted(statuses.items()))}")
+    print(f"votes_count={stored} votes rows={actual} -> {'consistent' if stored == actual else 'DRIFTED'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--posts", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--clicks", type=int, default=2, help="duplicate votes per user, post and round")
+    parser.add_argument("--batch", action="store_true", help="send each user's votes of a round to /vote/batch")
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.posts, args.rounds, args.clicks, args.batch))